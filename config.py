@@ -1,12 +1,15 @@
+import json
 import os
 from pathlib import Path
 
 import numpy as np
 
-from ok import ConfigOption, get_path_relative_to_exe
+from ok import ConfigOption, Logger, get_path_relative_to_exe
 
 version = "v5.0.11"
 
+logger = Logger.get_logger(__name__)
+
 
 def calculate_pc_exe_path(running_path):
     game_exe_folder = Path(running_path).parents[3]
@@ -66,6 +69,44 @@ monthly_card_config_option = ConfigOption('Monthly Card Config', {
     'Monthly Card Time': 'Your computer\'s local time when the monthly card will popup, hour in (1-24)'
 })
 
+inference_config_option = ConfigOption('Inference Config', {
+    'Detector Threads': 0,
+    'Detector Streams': 0,
+    'Detector Performance Hint': 'LATENCY',
+    'OCR Threads': 1,
+    'Echo Model': 'FP32',
+}, description='OpenVINO execution settings, restart to take effect', config_description={
+    'Detector Threads': 'Threads of the echo detector, 0 lets OpenVINO decide',
+    'Detector Streams': 'Parallel inference streams of the echo detector, 0 lets OpenVINO decide',
+    'Detector Performance Hint': 'LATENCY for the fastest single detection, THROUGHPUT for more parallel detections',
+    'OCR Threads': 'Threads of the OCR, -1 to use all cores',
+    'Echo Model': 'INT8 is faster on weak CPUs but slightly less accurate, '
+                  'compare with python -m src.OpenVinoYolo8Detect --compare assets/echo_model/best_int8.xml',
+}, config_type={
+    'Detector Performance Hint': {'type': 'drop_down', 'options': ['LATENCY', 'THROUGHPUT']},
+    'Echo Model': {'type': 'drop_down', 'options': ['FP32', 'INT8']},
+})
+
+
+def load_inference_config():
+    """
+    Read the saved Inference Config directly, the ocr params are needed before the global configs are loaded.
+    Run python -m src.OpenVinoYolo8Detect --calibrate to write the fastest detector settings for this CPU.
+    """
+    values = dict(inference_config_option.default_config)
+    try:
+        with open(get_path_relative_to_exe(os.path.join('configs', 'Inference Config.json')), 'r',
+                  encoding='utf-8') as f:
+            saved = json.load(f)
+        values.update({key: value for key, value in saved.items() if key in values})
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error('Error reading Inference Config, use the defaults', e)
+    return values
+
+
+inference_config = load_inference_config()
 
 config = {
     'debug': False,  # Optional, default: False
@@ -73,13 +114,14 @@ config = {
     'config_folder': 'configs',
     'screenshot_processor': make_bottom_right_black,
     'gui_icon': 'icon.png',
-    'global_configs': [key_config_option, pick_echo_config_option, monthly_card_config_option],
+    'global_configs': [key_config_option, pick_echo_config_option, monthly_card_config_option,
+                       inference_config_option],
     'ocr': {
         'lib': 'rapidocr',
         'target_height': 1080,
         'params': {
             'Global.with_openvino': True,
-            'EngineConfig.openvino.inference_num_threads': 1,
+            'EngineConfig.openvino.inference_num_threads': inference_config['OCR Threads'],
             'Rec.rec_keys_path': get_path_relative_to_exe(os.path.join('assets', 'ppocr_keys_v1.txt')),
         }
     },
@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+
+
+class ColorClassifier:
+    """
+    Classifies every pixel of an image against all registered color ranges in one pass.
+
+    Each registered range gets one bit of a uint8 plane, 8 ranges per plane. Per channel a 256 entry table holds the
+    bits of the ranges the channel value is inside of, cv2.LUT maps every channel through its table and the AND of
+    the three is the bitmask of all ranges the pixel is in, the same as cv2.inRange with color_range_to_bound for
+    every range.
+    """
+
+    def __init__(self, colors=None):
+        self.colors = []
+        self._bits = {}
+        self._lut = None
+        for color in colors or []:
+            self.add(color)
+
+    def add(self, color):
+        """
+        Register a {'r': (min, max), 'g': (min, max), 'b': (min, max)} range, returns its (plane, bit).
+        """
+        bit = self._bits.get(id(color))
+        if bit is None:
+            index = len(self.colors)
+            bit = (index // 8, 1 << (index % 8))
+            self.colors.append(color)
+            self._bits[id(color)] = bit
+            self._lut = None
+        return bit
+
+    def bit(self, color):
+        bit = self._bits.get(id(color))
+        return bit if bit is not None else self.add(color)
+
+    @property
+    def lut(self):
+        """
+        Per plane the b, g and r tables.
+        """
+        if self._lut is None:
+            values = np.arange(256)
+            lut = np.zeros(((len(self.colors) + 7) // 8, 3, 256), dtype=np.uint8)
+            for index, color in enumerate(self.colors):
+                for channel, key in enumerate(('b', 'g', 'r')):
+                    low, high = color[key]
+                    lut[index // 8, channel, (values >= low) & (values <= high)] |= 1 << (index % 8)
+            self._lut = [[np.ascontiguousarray(table) for table in plane] for plane in lut]
+        return self._lut
+
+    def classify(self, image):
+        """
+        Returns:
+            list: uint8 bitmask planes, bit(color) is set where the pixel is inside color.
+        """
+        # single channel LUTs are much faster than one 3 channel LUT
+        channels = cv2.split(image)
+        planes = []
+        for tables in self.lut:
+            b, g, r = (cv2.LUT(channel, table) for channel, table in zip(channels, tables))
+            planes.append(cv2.bitwise_and(cv2.bitwise_and(b, g), r))
+        return planes
+
+    def mask(self, planes, color):
+        """
+        uint8 mask of one color from a classify result, 255 inside the range like cv2.inRange.
+        """
+        plane, bit = self.bit(color)
+        return cv2.compare(cv2.bitwise_and(planes[plane], bit), 0, cv2.CMP_NE)
+
+    def count(self, planes, color):
+        plane, bit = self.bit(color)
+        return cv2.countNonZero(cv2.bitwise_and(planes[plane], bit))
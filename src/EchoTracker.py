@@ -0,0 +1,117 @@
+import time
+
+import cv2
+
+from ok import Box
+from src.OpenVinoYolo8Detect import box_iou as iou
+
+
+class EchoTracker:
+    """
+    Follows one echo between yolo detections, so the steering loop does not need a full inference every frame.
+
+    A detection seeds the track with the echo box and its image patch. In between detections the box is predicted
+    with a constant velocity model and corrected by template matching the patch around the prediction. A new
+    detection is requested every detect_interval frames or as soon as the template match confidence drops.
+    """
+
+    def __init__(self, detect_interval=5, min_confidence=0.6, search_scale=2.0, velocity_smoothing=0.5):
+        self.detect_interval = detect_interval
+        self.min_confidence = min_confidence
+        self.search_scale = search_scale
+        self.velocity_smoothing = velocity_smoothing
+        self.box = None
+        self.template = None
+        self.confidence = 0
+        self.velocity = (0.0, 0.0)  # pixels per second
+        self.last_time = 0
+        self.frames_since_detection = 0
+        self.detections = 0
+        self.tracked_frames = 0
+
+    def reset(self):
+        self.box = None
+        self.template = None
+        self.confidence = 0
+        self.velocity = (0.0, 0.0)
+        self.frames_since_detection = 0
+
+    def need_detection(self):
+        return self.box is None or self.frames_since_detection >= self.detect_interval or \
+            self.confidence < self.min_confidence
+
+    def update_detection(self, frame, boxes):
+        """
+        Seed or correct the track with yolo boxes of frame.
+
+        Returns:
+            Box: The box associated with the track, the highest IoU with the prediction, or the first box for a new track.
+                None if there are no boxes.
+        """
+        self.detections += 1
+        if not boxes:
+            self.reset()
+            return None
+        now = time.time()
+        if self.box is not None:
+            predicted = self._predict(now)
+            box = max(boxes, key=lambda b: iou(b, predicted))
+            if iou(box, predicted) <= 0:
+                box = boxes[0]
+        else:
+            box = boxes[0]
+        self._set_box(box, now)
+        self.template = box.crop_frame(frame).copy() if box.width > 0 and box.height > 0 else None
+        # the tracking confidence is a template match score, the patch was just cropped so it matches itself, the
+        # yolo score stays on the box and is not compared against min_confidence
+        self.confidence = 1.0 if self.template is not None else 0
+        self.frames_since_detection = 0
+        return box
+
+    def track(self, frame):
+        """
+        Predict the echo box in frame without running the model.
+
+        Returns:
+            Box: The tracked box with the template match score as confidence, or None if the track is lost.
+        """
+        if self.box is None or self.template is None:
+            return None
+        self.frames_since_detection += 1
+        self.tracked_frames += 1
+        now = time.time()
+        predicted = self._predict(now)
+        t_h, t_w = self.template.shape[:2]
+        margin_x = int(t_w * (self.search_scale - 1) / 2)
+        margin_y = int(t_h * (self.search_scale - 1) / 2)
+        x = max(0, int(predicted.x) - margin_x)
+        y = max(0, int(predicted.y) - margin_y)
+        to_x = min(frame.shape[1], int(predicted.x) + t_w + margin_x)
+        to_y = min(frame.shape[0], int(predicted.y) + t_h + margin_y)
+        if to_x - x < t_w or to_y - y < t_h:
+            self.confidence = 0
+            return None
+        result = cv2.matchTemplate(frame[y:to_y, x:to_x], self.template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        self.confidence = max_val
+        if max_val < self.min_confidence:
+            return None
+        box = Box(x + max_loc[0], y + max_loc[1], t_w, t_h, confidence=max_val, name=self.box.name)
+        self._set_box(box, now)
+        return box
+
+    def _predict(self, now):
+        dt = now - self.last_time
+        return Box(self.box.x + self.velocity[0] * dt, self.box.y + self.velocity[1] * dt, self.box.width,
+                   self.box.height, confidence=self.confidence, name=self.box.name)
+
+    def _set_box(self, box, now):
+        if self.box is not None and now > self.last_time:
+            dt = now - self.last_time
+            (cx, cy), (last_cx, last_cy) = box.center(), self.box.center()
+            a = self.velocity_smoothing
+            self.velocity = (a * (cx - last_cx) / dt + (1 - a) * self.velocity[0],
+                             a * (cy - last_cy) / dt + (1 - a) * self.velocity[1])
+        self.box = box
+        self.last_time = now
+
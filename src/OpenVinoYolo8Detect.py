@@ -1,53 +1,134 @@
+import argparse
+import json
 import os
+import platform
 import random
+import subprocess
 import time
+from datetime import datetime
 from typing import Tuple
 
 # import onnxruntime as ort # Removed onnxruntime
-from openvino import Core  # Added OpenVINO Core
+from openvino import Core, Layout, Type  # Added OpenVINO Core
+from openvino.preprocess import PrePostProcessor, ColorFormat
 import cv2
 import numpy as np
 
-from ok import Logger, Box, sort_boxes
+try:
+    from ok import Logger, Box, sort_boxes
+except ImportError:  # ok-script needs Windows, the benchmark below also runs on a plain CPU Linux box
+    import logging
+
+
+    class Logger:
+        @staticmethod
+        def get_logger(name):
+            return logging.getLogger(name)
+
+
+    class Box:
+        def __init__(self, x, y, width=0, height=0, confidence=1.0, name=None):
+            self.x, self.y, self.width, self.height = x, y, width, height
+            self.confidence = confidence
+            self.name = name
+
+        def copy(self, x_offset=0, y_offset=0, width_offset=0, height_offset=0, name=None):
+            return Box(self.x + x_offset, self.y + y_offset, self.width + width_offset, self.height + height_offset,
+                       self.confidence, name or self.name)
+
+        def __repr__(self):
+            return f"Box(x={self.x}, y={self.y}, w={self.width}, h={self.height}, name='{self.name}', conf={self.confidence:.2f})"
+
+
+    def sort_boxes(boxes):
+        return sorted(boxes, key=lambda box: (box.y, box.x))
 
 logger = Logger.get_logger(__name__)
 
 
 class OpenVinoYolo8Detect:  # Renamed class
 
-    def __init__(self, weights='echo.onnx', model_h=640, model_w=640, iou_thres=0.45):
+    def __init__(self, weights='echo.onnx', model_h=640, model_w=640, iou_thres=0.45, embed_preprocess=False,
+                 cache_dir=None, threads=0, streams=0, performance_hint='LATENCY'):
         """
         yolov OpenVINO inference
         dic_labels: {0: 'person', 1: 'bicycle'}
+        embed_preprocess: build color conversion, normalization and layout into the compiled model with
+            PrePostProcessor, so detect() only letterboxes the uint8 BGR frame into a reused NHWC buffer.
+        cache_dir: OpenVINO CACHE_DIR, the compiled blob is saved there and reused by later launches.
+        threads, streams: INFERENCE_NUM_THREADS and NUM_STREAMS of the CPU plugin, 0 lets OpenVINO decide.
+        performance_hint: LATENCY or THROUGHPUT.
         """
         self.dic_labels = {0: 'echo'}
         self.weights = weights
         self.model_size = (model_w, model_h)
         self.iou_threshold = iou_thres
         self.openfile_name_model = weights
+        self.embed_preprocess = embed_preprocess
+        self._input_buffer = None
+        self._buffer_layout = None
 
         # --- OpenVINO Initialization ---
         self.core = Core()
-        # self.core.set_property("CPU", {"INFERENCE_NUM_THREADS": str(1)})
+        self.compile_config = compile_config(threads, streams, performance_hint)
         device = "CPU"  # Default device, tries GPU then CPU etc.
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.core.set_property({"CACHE_DIR": cache_dir})
 
         try:
-            logger.info(f"Compiling OpenVINO model for {device}...")
+            logger.info(f"Compiling OpenVINO model for {device}... cache_dir: {cache_dir} config: {self.compile_config}")
+            start = time.time()
             # Read and compile the ONNX model directly
             model = self.core.read_model(model=self.openfile_name_model)
-            self.compiled_model = self.core.compile_model(model=model, device_name=device,
-            config={"PERFORMANCE_HINT": "LATENCY"},)
+            input_shape = model.input(0).shape
+            if (input_shape[2], input_shape[3]) != (model_h, model_w):
+                # only works if the model was not exported with a baked-in anchor grid, shape inference raises otherwise
+                logger.info(f"Reshaping model input {input_shape} to {model_h}x{model_w}")
+                model.reshape([1, 3, model_h, model_w])
+            # the model input is NCHW
+            self.input_height = model.input(0).shape[2]
+            self.input_width = model.input(0).shape[3]
+            if self.embed_preprocess:
+                model = self._embed_preprocess(model)
+            self.compiled_model = self.core.compile_model(model=model, device_name=device, config=self.compile_config)
             # Get input/output names (usually one input, one output for YOLOv5)
             self.input_layer = self.compiled_model.input(0)
             self.output_layer = self.compiled_model.output(0)
-            self.input_width = self.input_layer.shape[2]
-            self.input_height = self.input_layer.shape[3]
-            logger.info(f"OpenVINO model compiled successfully for {self.compiled_model} {self.input_width}x{self.input_height}.")
+            logger.info(f"OpenVINO model compiled successfully for {self.compiled_model} {self.input_width}x{self.input_height} embed_preprocess:{self.embed_preprocess} cost {time.time() - start:.2f}s.")
         except Exception as e:
             logger.error(f"Error initializing OpenVINO: {e}")
             raise RuntimeError("Could not initialize OpenVINO model") from e
         # --- End OpenVINO Initialization ---
 
+    def warm_up(self):
+        """
+        Run one inference on an empty input, the first inference is much slower than the steady state.
+        Runs on its own infer request and input, so a detect() on another thread is not affected.
+        """
+        start = time.time()
+        request = self.compiled_model.create_infer_request()
+        request.infer({self.input_layer: np.zeros(tuple(self.input_layer.shape),
+                                                  dtype=self.input_layer.element_type.to_dtype())})
+        logger.info(f"OpenVINO model warm up cost {time.time() - start:.2f}s")
+
+    @staticmethod
+    def _embed_preprocess(model):
+        """
+        Make the model take a uint8 BGR NHWC tensor, BGR->RGB, /255 and NHWC->NCHW run inside the compiled graph.
+        """
+        ppp = PrePostProcessor(model)
+        ppp.input().tensor() \
+            .set_element_type(Type.u8) \
+            .set_layout(Layout('NHWC')) \
+            .set_color_format(ColorFormat.BGR)
+        ppp.input().model().set_layout(Layout('NCHW'))
+        ppp.input().preprocess() \
+            .convert_element_type(Type.f32) \
+            .convert_color(ColorFormat.RGB) \
+            .scale(255.0)
+        return ppp.build()
+
     def letterbox(self, img: np.ndarray, new_shape: Tuple[int, int] = (640, 640)) -> Tuple[np.ndarray, Tuple[int, int]]:
         """
         Resize and reshape images while maintaining aspect ratio by adding padding.
@@ -77,11 +158,44 @@ class OpenVinoYolo8Detect:  # Renamed class
 
         return img, (top, left)
 
+    def letterbox_into_buffer(self, img: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """
+        Same as letterbox, but resizes straight into a preallocated (1, height, width, 3) uint8 buffer.
+
+        The buffer is reused across calls, the padding is only refilled when the letterbox layout changes.
+
+        Returns:
+            (np.ndarray): The NHWC input buffer, valid until the next call.
+            (Tuple[int, int]): Padding values (top, left) applied to the image.
+        """
+        if self._input_buffer is None:
+            self._input_buffer = np.empty((1, self.input_height, self.input_width, 3), dtype=np.uint8)
+        shape = img.shape[:2]
+        r = min(self.input_height / shape[0], self.input_width / shape[1])
+        new_unpad = int(round(shape[1] * r)), int(round(shape[0] * r))
+        dw, dh = (self.input_width - new_unpad[0]) / 2, (self.input_height - new_unpad[1]) / 2
+        top = int(round(dh - 0.1))
+        left = int(round(dw - 0.1))
+
+        layout = (top, left, new_unpad)
+        if layout != self._buffer_layout:
+            self._input_buffer.fill(114)
+            self._buffer_layout = layout
+        target = self._input_buffer[0, top:top + new_unpad[1], left:left + new_unpad[0]]
+        if shape[::-1] != new_unpad:
+            cv2.resize(img, new_unpad, dst=target, interpolation=cv2.INTER_LINEAR)
+        else:
+            target[...] = img
+        return self._input_buffer, (top, left)
+
     def _preprocess(self, img):
-        """图像预处理（保持宽高比的缩放填充） - unchanged"""
+        """图像预处理（保持宽高比的缩放填充）"""
+        if self.embed_preprocess:
+            return self.letterbox_into_buffer(img)
+
         img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
 
-        img, pad = self.letterbox(img, (self.input_width, self.input_height))
+        img, pad = self.letterbox(img, (self.input_height, self.input_width))
 
         # Normalize the image data by dividing it by 255.0
         image_data = np.array(img) / 255.0
@@ -95,88 +209,73 @@ class OpenVinoYolo8Detect:  # Renamed class
         # Return the preprocessed image data
         return image_data, pad
 
-
-    def _postprocess(self,  outputs, padding, orig_shape, confidence_threshold, label):
+    def _postprocess(self, outputs, padding, orig_shape, confidence_threshold, label, offset=(0, 0)):
         """
-        Perform post-processing on the model's output to extract and visualize detections.
+        Convert the raw model output to Boxes, fully array based.
 
-        This method processes the raw model output to extract bounding boxes, scores, and class IDs.
-        It applies non-maximum suppression to filter overlapping detections and draws the results on the input image.
+        The output has one column per anchor: (cx, cy, w, h, class scores...). The anchors are thresholded,
+        decoded and scaled back to the original image in NumPy, then filtered by non-maximum suppression.
 
         Args:
-            input_image (np.ndarray): The input image.
-            output (List[np.ndarray]): The output arrays from the model.
-            pad (Tuple[int, int]): Padding values (top, left) used during letterboxing.
+            outputs (np.ndarray): The raw output tensor of the model, shape (1, 4 + classes, anchors).
+            padding (Tuple[int, int]): Padding values (top, left) used during letterboxing.
+            orig_shape (Tuple[int, int]): (height, width) of the original image.
+            confidence_threshold (float): Minimum class score to keep a detection.
+            label (int): Class id to keep, -1 for all classes.
+            offset (Tuple[int, int]): (x, y) added to every box, the position of the region the image was cropped from.
 
         Returns:
-            (np.ndarray): The input image with detections drawn on it.
+            (List[Box]): The detections after NMS, highest confidence first.
         """
-        # Transpose and squeeze the output to match the expected shape
-        outputs = np.transpose(np.squeeze(outputs[0]))
-
-        # Get the number of rows in the outputs array
-        rows = outputs.shape[0]
+        predictions = outputs[0]  # (4 + classes, anchors), no copy
+
+        class_scores = predictions[4:]
+        if class_scores.shape[0] == 1:
+            class_ids = np.zeros(class_scores.shape[1], dtype=np.intp)
+            max_scores = class_scores[0]
+        else:
+            class_ids = np.argmax(class_scores, axis=0)
+            max_scores = np.take_along_axis(class_scores, class_ids[np.newaxis, :], axis=0)[0]
+
+        keep = max_scores >= confidence_threshold
+        if label != -1:
+            keep &= class_ids == label
+        if not np.any(keep):
+            return []
 
-        # Lists to store the bounding boxes, scores, and class IDs of the detections
-        boxes = []
-        scores = []
-        class_ids = []
+        scores = max_scores[keep]
+        class_ids = class_ids[keep]
+        x, y, w, h = predictions[:4, keep]
 
         # Calculate the scaling factors for the bounding box coordinates
         gain = min(self.input_height / orig_shape[0], self.input_width / orig_shape[1])
 
-        outputs[:, 0] -= padding[1]
-        outputs[:, 1] -= padding[0]
+        # int() truncates towards zero, same as astype
+        boxes = np.empty((len(scores), 4), dtype=np.int32)
+        boxes[:, 0] = (x - padding[1] - w / 2) / gain
+        boxes[:, 1] = (y - padding[0] - h / 2) / gain
+        boxes[:, 2] = w / gain
+        boxes[:, 3] = h / gain
 
-        # Iterate over each row in the outputs array
-        for i in range(rows):
-            # Extract the class scores from the current row
-            classes_scores = outputs[i][4:]
+        indices = nms_boxes(boxes, scores, confidence_threshold, self.iou_threshold)
 
-            # Find the maximum score among the class scores
-            max_score = np.amax(classes_scores)
-            class_id = np.argmax(classes_scores)
-            # If the maximum score is above the confidence threshold
-            if max_score >= confidence_threshold and (label==-1 or label==class_id):
-                # Get the class ID with the highest score
-
-
-                # Extract the bounding box coordinates from the current row
-                x, y, w, h = outputs[i][0], outputs[i][1], outputs[i][2], outputs[i][3]
-
-                # Calculate the scaled coordinates of the bounding box
-                left = int((x - w / 2) / gain)
-                top = int((y - h / 2) / gain)
-                width = int(w / gain)
-                height = int(h / gain)
-
-                # Add the class ID, score, and box coordinates to the respective lists
-                class_ids.append(class_id)
-                scores.append(max_score)
-                boxes.append([left, top, width, height])
-
-        # Apply non-maximum suppression to filter out overlapping bounding boxes
-        indices = cv2.dnn.NMSBoxes(boxes, scores, confidence_threshold, self.iou_threshold)
-
-        # Iterate over the selected indices after non-maximum suppression
         results = []
         for i in indices:
-            # Get the box, score, and class ID corresponding to the index
             box = boxes[i]
-            box_obj = Box(box[0], box[1], box[2], box[3])  # Use Box class if available
+            box_obj = Box(int(box[0]) + offset[0], int(box[1]) + offset[1], int(box[2]), int(box[3]))
             box_obj.name = self.dic_labels.get(int(class_ids[i]), 'unknown')
-            box_obj.confidence = scores[i]
+            box_obj.confidence = float(scores[i])
             results.append(box_obj)
-            # Draw the detection on the input image
-            # self.draw_detections(input_image, box, score, class_id)
         return results
 
     # 推理
-    def detect(self, image, threshold=0.5, label=-1):
+    def detect(self, image, threshold=0.5, label=-1, box=None):
         '''
         预测
+        box: only detect inside this region of the image, the returned boxes are still in image coordinates
         '''
         try:
+            image, offset = crop_region(image, box)
             h, w = image.shape[:2]
             img_data, pad = self._preprocess(image)
             # input_tensor = np.expand_dims(img_data, axis=0)  # Add batch dimension
@@ -188,7 +287,7 @@ class OpenVinoYolo8Detect:  # Renamed class
             # Extract the output tensor using the output layer obtained during init
             outputs = results[self.output_layer]
             # --- End OpenVINO Inference ---
-            boxes = self._postprocess(outputs, pad, (h, w), threshold, label)
+            boxes = self._postprocess(outputs, pad, (h, w), threshold, label, offset)
 
             return sort_boxes(boxes)
         except Exception as e:
@@ -196,76 +295,368 @@ class OpenVinoYolo8Detect:  # Renamed class
             return []
 
 
-# --- Main execution part needs to be updated to use the new class ---
-if __name__ == '__main__':
-    # Ensure ok module and Box class are available, or provide stubs
-    class MockLogger:
-        def get_logger(self, name): return self
-
-        def debug(self, msg, *args): print(f"DEBUG: {msg}")
-
-        def info(self, msg, *args): print(f"INFO: {msg}")
-
-        def warning(self, msg, *args): print(f"WARN: {msg}")
-
-        def error(self, msg, *args, **kwargs): print(f"ERROR: {msg}")
-
-
-    class MockOk:
-        class og: use_dml = False  # Simulate ok.og.use_dml if needed
-
-        Logger = MockLogger()
-
-
-    if 'ok' not in globals():  # Define stubs if 'ok' module is not present
-        ok = MockOk()
-        Logger = ok.Logger
-
-
-        class Box:
-            def __init__(self, x, y, w, h):
-                self.x, self.y, self.w, self.h = x, y, w, h
-                self.name = "unknown"
-                self.confidence = 0.0
-
-            def __repr__(self):
-                return f"Box(x={self.x}, y={self.y}, w={self.w}, h={self.h}, name='{self.name}', conf={self.confidence:.2f})"
-
-    image_path = "tests/images/echo.png"
-    weights = "assets/echo_model/best.xml"  # OpenVINO reads ONNX directly
-    model_h = 640
-    model_w = 640
-
-
-    # NOTE: You need a real ONNX model at the 'weights' path for inference to work.
-    if not os.path.exists(weights):
-        print(f"ERROR: Model file not found at {weights}. Inference will fail.")
-        print("Please download or place yolov5s_320.onnx in assets/yolo/")
-        # Create a dummy file to avoid immediate crash during init, but it won't work
-        # with open(weights, 'w') as f: f.write('') # This won't be a valid model
+def crop_region(image, box):
+    """
+    Crop the region of a Box from the image, clipped to the image.
+
+    Returns:
+        (np.ndarray): The cropped image, or the image itself if box is None.
+        (Tuple[int, int]): (x, y) of the cropped region in the image.
+    """
+    if box is None:
+        return image, (0, 0)
+    x, y = max(0, int(box.x)), max(0, int(box.y))
+    to_x, to_y = min(image.shape[1], int(box.x + box.width)), min(image.shape[0], int(box.y + box.height))
+    return image[y:to_y, x:to_x], (x, y)
+
+
+def region_key(box):
+    """
+    Hashable key of a detection region, None for the whole image.
+    """
+    return None if box is None else (box.x, box.y, box.width, box.height)
+
+
+def nms_boxes(boxes, scores, score_threshold, iou_threshold):
+    """
+    Non-maximum suppression on (left, top, width, height) boxes.
+
+    Uses cv2.dnn.NMSBoxes when OpenCV is built with the dnn module, otherwise falls back to numpy_nms.
+
+    Returns:
+        (np.ndarray): Indices of the kept boxes, highest score first.
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.intp)
+    if _cv2_nms is not None:
+        indices = _cv2_nms(boxes.tolist(), scores.tolist(), score_threshold, iou_threshold)
+        return np.asarray(indices, dtype=np.intp).reshape(-1)
+    return numpy_nms(boxes, scores, score_threshold, iou_threshold)
+
+
+def numpy_nms(boxes, scores, score_threshold, iou_threshold):
+    """
+    Pure NumPy non-maximum suppression, matching cv2.dnn.NMSBoxes on (left, top, width, height) boxes.
+
+    Returns:
+        (np.ndarray): Indices of the kept boxes, highest score first.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    order = np.flatnonzero(scores > score_threshold)
+    order = order[np.argsort(-scores[order], kind='stable')]
+
+    x1 = boxes[:, 0]
+    y1 = boxes[:, 1]
+    x2 = x1 + boxes[:, 2]
+    y2 = y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        inter_h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = inter_w * inter_h
+        union = areas[i] + areas[rest] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.intp)
+
+
+_cv2_nms = getattr(getattr(cv2, 'dnn', None), 'NMSBoxes', None)
+
+
+def compile_config(threads=0, streams=0, performance_hint='LATENCY'):
+    config = {"PERFORMANCE_HINT": performance_hint}
+    if threads > 0:
+        config["INFERENCE_NUM_THREADS"] = str(threads)
+    if streams > 0:
+        config["NUM_STREAMS"] = str(streams)
+    return config
+
+
+def benchmark(weights, image_dir='tests/images', runs=50, warm_up=5, threshold=0.5, label=-1, input_size=640,
+              embed_preprocess=True, threads=0, streams=0, performance_hint='LATENCY'):
+    """
+    Benchmark the detector on every image in image_dir, timing preprocess, inference and postprocess/NMS separately.
+
+    Returns:
+        dict: JSON serializable result with the environment, per image and overall latency percentiles in ms.
+    """
+    detector = OpenVinoYolo8Detect(weights=weights, model_h=input_size, model_w=input_size,
+                                   embed_preprocess=embed_preprocess, threads=threads, streams=streams,
+                                   performance_hint=performance_hint)
+    stages = ('preprocess', 'inference', 'postprocess', 'total')
+    all_timings = {stage: [] for stage in stages}
+    images = {}
+    for file_name in sorted(os.listdir(image_dir)):
+        image = cv2.imdecode(np.fromfile(os.path.join(image_dir, file_name), dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            continue
+        timings = {stage: [] for stage in stages}
+        boxes = []
+        for i in range(warm_up + runs):
+            t0 = time.perf_counter()
+            img_data, pad = detector._preprocess(image)
+            t1 = time.perf_counter()
+            outputs = detector.compiled_model({detector.input_layer: img_data})[detector.output_layer]
+            t2 = time.perf_counter()
+            boxes = sort_boxes(detector._postprocess(outputs, pad, image.shape[:2], threshold, label))
+            t3 = time.perf_counter()
+            if i >= warm_up:
+                for stage, cost in zip(stages, (t1 - t0, t2 - t1, t3 - t2, t3 - t0)):
+                    timings[stage].append(cost * 1000)
+        for stage in stages:
+            all_timings[stage] += timings[stage]
+        images[file_name] = {'shape': list(image.shape[:2]), 'boxes': len(boxes),
+                             'latency_ms': {stage: latency_stats(timings[stage]) for stage in stages}}
+    return {
+        'env': benchmark_env(),
+        'params': {'weights': weights, 'runs': runs, 'warm_up': warm_up, 'threshold': threshold, 'label': label,
+                   'input_size': input_size, 'embed_preprocess': embed_preprocess, 'threads': threads,
+                   'streams': streams, 'performance_hint': performance_hint},
+        'images': images,
+        'latency_ms': {stage: latency_stats(all_timings[stage]) for stage in stages},
+    }
+
+
+def calibration_candidates(cpu_count=None):
+    """
+    (threads, streams, performance_hint) settings worth trying on this CPU, 0 lets OpenVINO decide.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    threads = sorted({t for t in (1, 2, 4, cpu_count // 2) if 0 < t < cpu_count})
+    candidates = [(0, 0, 'LATENCY')]
+    candidates += [(t, 1, 'LATENCY') for t in threads]
+    candidates += [(0, 2, 'THROUGHPUT')]
+    candidates += [(t, 2, 'THROUGHPUT') for t in threads if t >= 2]
+    return candidates
+
+
+def calibrate(weights, image_dir='tests/images', runs=20, warm_up=3, input_size=640, candidates=None):
+    """
+    Benchmark every candidate execution setting on the images and pick the lowest mean total latency.
+
+    Returns:
+        tuple: (best settings dict with threads, streams and performance_hint, list of every candidate's result)
+    """
+    results = []
+    for threads, streams, hint in candidates or calibration_candidates():
+        result = benchmark(weights, image_dir, runs=runs, warm_up=warm_up, input_size=input_size, threads=threads,
+                           streams=streams, performance_hint=hint)
+        latency = result['latency_ms']['total']
+        logger.info(f'calibrate threads:{threads} streams:{streams} hint:{hint} '
+                    f'mean:{latency["mean"]:.2f}ms p95:{latency["p95"]:.2f}ms')
+        results.append({'threads': threads, 'streams': streams, 'performance_hint': hint, 'latency_ms': latency})
+    best = min(results, key=lambda r: r['latency_ms']['mean'])
+    return {key: best[key] for key in ('threads', 'streams', 'performance_hint')}, results
+
+
+def save_inference_config(settings, config_file):
+    """
+    Write calibrated settings into the Inference Config json, the keys of config.inference_config_option.
+    """
+    values = {}
+    if os.path.exists(config_file):
+        with open(config_file, 'r', encoding='utf-8') as f:
+            values = json.load(f)
+    values.update({'Detector Threads': settings['threads'], 'Detector Streams': settings['streams'],
+                   'Detector Performance Hint': settings['performance_hint']})
+    if os.path.dirname(config_file):
+        os.makedirs(os.path.dirname(config_file), exist_ok=True)
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump(values, f, indent=4)
+
+
+def compare_models(reference_weights, candidate_weights, image_dir='tests/images', threshold=0.5, label=-1,
+                   match_iou=0.5, runs=10, input_size=640):
+    """
+    Run both models on every image and measure how well the candidate (e.g. the INT8 model) agrees with the reference.
+
+    The reference boxes are treated as ground truth, a candidate box matches the unmatched reference box with the
+    highest IoU if it is at least match_iou.
+
+    Returns:
+        dict: JSON serializable per image and overall precision, recall and mean total latency of both models.
+    """
+    detectors = {name: OpenVinoYolo8Detect(weights=weights, model_h=input_size, model_w=input_size,
+                                           embed_preprocess=True)
+                 for name, weights in (('reference', reference_weights), ('candidate', candidate_weights))}
+    images = {}
+    total = {'reference_boxes': 0, 'candidate_boxes': 0, 'matched': 0}
+    latencies = {name: [] for name in detectors}
+    for file_name in sorted(os.listdir(image_dir)):
+        image = cv2.imdecode(np.fromfile(os.path.join(image_dir, file_name), dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            continue
+        boxes = {}
+        for name, detector in detectors.items():
+            detector.detect(image, threshold=threshold, label=label)
+            for _ in range(runs):
+                start = time.perf_counter()
+                boxes[name] = detector.detect(image, threshold=threshold, label=label)
+                latencies[name].append((time.perf_counter() - start) * 1000)
+        matched = match_boxes(boxes['reference'], boxes['candidate'], match_iou)
+        counts = {'reference_boxes': len(boxes['reference']), 'candidate_boxes': len(boxes['candidate']),
+                  'matched': matched}
+        for key, value in counts.items():
+            total[key] += value
+        images[file_name] = dict(counts, **precision_recall(**counts))
+    return {
+        'env': benchmark_env(),
+        'params': {'reference': reference_weights, 'candidate': candidate_weights, 'threshold': threshold,
+                   'label': label, 'match_iou': match_iou, 'runs': runs, 'input_size': input_size},
+        'images': images,
+        'accuracy': dict(total, **precision_recall(**total)),
+        'latency_ms': {name: latency_stats(values) for name, values in latencies.items()},
+    }
+
+
+def match_boxes(reference, candidate, match_iou=0.5):
+    """
+    Greedily match candidate boxes to reference boxes by IoU, highest confidence first. Returns the match count.
+    """
+    unmatched = list(reference)
+    matched = 0
+    for box in sorted(candidate, key=lambda b: b.confidence, reverse=True):
+        if not unmatched:
+            break
+        ious = [box_iou(box, ref) for ref in unmatched]
+        best = int(np.argmax(ious))
+        if ious[best] >= match_iou:
+            unmatched.pop(best)
+            matched += 1
+    return matched
+
+
+def box_iou(box1, box2):
+    inter_w = min(box1.x + box1.width, box2.x + box2.width) - max(box1.x, box2.x)
+    inter_h = min(box1.y + box1.height, box2.y + box2.height) - max(box1.y, box2.y)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0
+    inter = inter_w * inter_h
+    return inter / (box1.width * box1.height + box2.width * box2.height - inter)
+
+
+def precision_recall(reference_boxes, candidate_boxes, matched):
+    # no boxes at all on both sides is a perfect agreement
+    precision = matched / candidate_boxes if candidate_boxes else float(reference_boxes == 0)
+    recall = matched / reference_boxes if reference_boxes else float(candidate_boxes == 0)
+    return {'precision': round(precision, 4), 'recall': round(recall, 4)}
+
+
+def quantize(weights, image_dir='tests/images', output=None, input_size=640):
+    """
+    Post training INT8 quantization of the FP32 model with nncf, calibrated on the images in image_dir.
+    nncf is only needed to build the model, it's not a runtime dependency.
+    """
+    import nncf
+    import openvino
+    detector = OpenVinoYolo8Detect(weights=weights, model_h=input_size, model_w=input_size)
+    calibration_images = []
+    for file_name in sorted(os.listdir(image_dir)):
+        image = cv2.imdecode(np.fromfile(os.path.join(image_dir, file_name), dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is not None:
+            calibration_images.append(detector._preprocess(image)[0])
+    model = detector.core.read_model(weights)
+    quantized = nncf.quantize(model, nncf.Dataset(calibration_images), subset_size=len(calibration_images),
+                              preset=nncf.QuantizationPreset.MIXED)
+    output = output or weights.replace('.xml', '_int8.xml')
+    openvino.save_model(quantized, output)
+    return output
+
+
+def latency_stats(values):
+    if not values:
+        return {}
+    values = np.asarray(values)
+    p50, p95, p99 = np.percentile(values, (50, 95, 99))
+    return {'p50': round(float(p50), 3), 'p95': round(float(p95), 3), 'p99': round(float(p99), 3),
+            'mean': round(float(values.mean()), 3), 'count': int(values.size)}
+
+
+def benchmark_env():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    import openvino
+    return {'time': datetime.now().isoformat(timespec='seconds'), 'commit': commit, 'platform': platform.platform(),
+            'machine': platform.machine(), 'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+            'python': platform.python_version(), 'openvino': openvino.__version__, 'opencv': cv2.__version__,
+            'numpy': np.__version__}
+
+
+def print_benchmark(result):
+    print(f"{'image':<24}{'stage':<13}{'p50':>9}{'p95':>9}{'p99':>9}  ms")
+    rows = [(name, image['latency_ms']) for name, image in result['images'].items()]
+    rows.append(('ALL', result['latency_ms']))
+    for name, latency in rows:
+        for stage, stats in latency.items():
+            print(f"{name:<24}{stage:<13}{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['p99']:>9.2f}")
+            name = ''
 
-    # Use the new OpenVINO class
-    yolov = OpenVinoYolo8Detect(weights=weights, model_w=model_w, model_h=model_h)
 
-    # Test 1
-    big_img = cv2.imdecode(np.fromfile(file=image_path, dtype=np.uint8), cv2.IMREAD_COLOR)
-    if big_img is None:
-        print(f"Error loading image: {image_path}")
-    else:
-        start_time = time.time()
-        for i in range(100):
-            res_loc = yolov.detect(big_img, label=0)  # label=12 -> '声骸'
-        end_time = time.time()
-        print(f"Detection 1 time: {(end_time - start_time) * 1000:.2f} ms")
-
-    # Test 2
-    img2 = cv2.imread("tests/images/echo2.png")
-    if img2 is None:
-        print("Error loading image: tests/images/echo2.png")
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Echo detector latency benchmark, run from the project root: '
+                                                 'python -m src.OpenVinoYolo8Detect')
+    parser.add_argument('--weights', default=os.path.join('assets', 'echo_model', 'best.xml'))
+    parser.add_argument('--images', default=os.path.join('tests', 'images'))
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--warm-up', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--input-size', type=int, default=640)
+    parser.add_argument('--no-embed-preprocess', action='store_true', help='preprocess in python instead of in the model')
+    parser.add_argument('--output', default=os.path.join('logs', 'echo_detect_benchmark.json'))
+    parser.add_argument('--calibrate', action='store_true',
+                        help='benchmark candidate thread/stream/hint settings and save the fastest to --config')
+    parser.add_argument('--config', default=os.path.join('configs', 'Inference Config.json'))
+    parser.add_argument('--compare', metavar='CANDIDATE_WEIGHTS',
+                        help='compare the accuracy and latency of another model, e.g. best_int8.xml, with --weights')
+    parser.add_argument('--quantize', metavar='OUTPUT',
+                        help='quantize --weights to INT8 with nncf, calibrated on --images')
+    args = parser.parse_args()
+    # a no-op if ok-script already set up the logging, without it nothing shows the log of the command line run
+    import logging
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.calibrate:
+        best_settings, calibration = calibrate(args.weights, args.images, runs=args.runs, warm_up=args.warm_up,
+                                               input_size=args.input_size)
+        for candidate in calibration:
+            print(f"threads:{candidate['threads']:<3} streams:{candidate['streams']:<3} "
+                  f"hint:{candidate['performance_hint']:<11} mean:{candidate['latency_ms']['mean']:>8.2f}ms "
+                  f"p95:{candidate['latency_ms']['p95']:>8.2f}ms")
+        save_inference_config(best_settings, args.config)
+        print(f'fastest {best_settings} saved to {args.config}')
+    elif args.quantize:
+        print(f'INT8 model saved to {quantize(args.weights, args.images, args.quantize, input_size=args.input_size)}')
+    elif args.compare:
+        comparison = compare_models(args.weights, args.compare, args.images, threshold=args.threshold,
+                                    runs=args.runs, input_size=args.input_size)
+        print(f"{'image':<24}{'ref':>5}{'cand':>6}{'match':>7}{'precision':>11}{'recall':>8}")
+        for name, result in list(comparison['images'].items()) + [('ALL', comparison['accuracy'])]:
+            print(f"{name:<24}{result['reference_boxes']:>5}{result['candidate_boxes']:>6}{result['matched']:>7}"
+                  f"{result['precision']:>11.3f}{result['recall']:>8.3f}")
+        for name, stats in comparison['latency_ms'].items():
+            print(f"{name} detect latency p50:{stats['p50']:.2f}ms p95:{stats['p95']:.2f}ms mean:{stats['mean']:.2f}ms")
+        if os.path.dirname(args.output):
+            os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(comparison, f, indent=2)
+        print(f'comparison result saved to {args.output}')
     else:
-        start_time = time.time()
-        for i in range(100):
-            res_loc = yolov.detect(img2, label=0)
-        end_time = time.time()
-        print(f"Detection 2 time: {(end_time - start_time) * 1000:.2f} ms")
-
+        benchmark_result = benchmark(args.weights, args.images, runs=args.runs, warm_up=args.warm_up,
+                                     threshold=args.threshold, input_size=args.input_size,
+                                     embed_preprocess=not args.no_embed_preprocess)
+        print_benchmark(benchmark_result)
+        if os.path.dirname(args.output):
+            os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(benchmark_result, f, indent=2)
+        print(f'benchmark result saved to {args.output}')
@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+
+
+class RegionChangeDetector:
+    """
+    Tells if a region of interest changed since it was last checked, so the result of a template match on an
+    unchanged region can be reused on the next frame.
+
+    Every ROI keeps a signature of every stride-th pixel, a region is unchanged if no pixel of the new signature differs
+    by more than tolerance, so any change at least stride pixels wide is seen while capture noise is ignored. Only
+    worth it where the reused work costs much more than the compare, like a template match. Counts checks and changes
+    per ROI, change_rates() shows which checks are wasted work. Keep one detector per task, a reused answer is only
+    valid for the caller that computed it.
+    """
+
+    def __init__(self, stride=2, tolerance=8):
+        self.stride = stride
+        self.tolerance = tolerance
+        self._signatures = {}
+        self.checks = {}
+        self.changes = {}
+
+    def signature(self, frame, box):
+        return np.ascontiguousarray(box.crop_frame(frame)[::self.stride, ::self.stride])
+
+    def changed(self, name, frame, box):
+        """
+        True if the box region of frame differs from the last check of name, or name was never checked.
+        """
+        signature = self.signature(frame, box)
+        last = self._signatures.get(name)
+        changed = last is None or last.shape != signature.shape or signature.size == 0 or \
+                  cv2.norm(last, signature, cv2.NORM_INF) > self.tolerance
+        self._signatures[name] = signature
+        self.checks[name] = self.checks.get(name, 0) + 1
+        if changed:
+            self.changes[name] = self.changes.get(name, 0) + 1
+        return changed
+
+    def reset(self, name=None):
+        if name is None:
+            self._signatures.clear()
+        else:
+            self._signatures.pop(name, None)
+
+    def change_rates(self):
+        return {name: self.changes.get(name, 0) / checks for name, checks in self.checks.items()}
@@ -432,8 +432,8 @@ class BaseChar:
         return self.current_con
 
     def is_forte_full(self):
-        box = self.task.box_of_screen_scaled(3840, 2160, 2251, 1993, 2311, 2016, name='forte_full', hcenter=True)
-        white_percent = self.task.calculate_color_percentage(forte_white_color, box)
+        box = self.task.hud.boxes['forte_full'].copy()
+        white_percent = self.task.hud['forte_full']
         # num_labels, stats = get_connected_area_by_color(box.crop_frame(self.task.frame), forte_white_color,
         #                                                 connectivity=8)
         # total_area = 0
@@ -487,15 +487,13 @@ class BaseChar:
         self.logger.debug('heavy attack end')
 
     def current_resonance(self):
-        return self.task.calculate_color_percentage(text_white_color,
-                                                    self.task.get_box_by_name('box_resonance'))
+        return self.task.hud['resonance']
 
     def current_echo(self):
-        return self.task.calculate_color_percentage(text_white_color,
-                                                    self.task.get_box_by_name('box_echo'))
+        return self.task.hud['echo']
 
     def current_liberation(self):
-        return self.task.calculate_color_percentage(text_white_color, self.task.get_box_by_name('box_liberation'))
+        return self.task.hud['liberation']
 
     def flying(self):
         return self.current_resonance() == 0
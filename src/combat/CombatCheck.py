@@ -1,9 +1,16 @@
 import re
 import time
+from collections import deque
+
+import cv2
+import numpy as np
 
 from ok import find_boxes_by_name, Logger
-from ok import find_color_rectangles, get_mask_in_color_range, is_pure_black
+from ok import get_mask_in_color_range, is_pure_black, color_range_to_bound
 from src import text_white_color
+from src.char.BaseChar import forte_white_color
+from src.combat.HealthBarTracker import HealthBarTracker
+from src.combat.HudState import HudState
 from src.task.BaseWWTask import BaseWWTask
 
 logger = Logger.get_logger(__name__)
@@ -16,6 +23,7 @@ class CombatCheck(BaseWWTask):
         self._in_combat = False
         self.boss_lv_template = None
         self.boss_lv_mask = None
+        self.boss_lv_color = None
         self._in_liberation = False  # return True
         self.has_count_down = False
         self.last_out_of_combat_time = 0
@@ -23,12 +31,19 @@ class CombatCheck(BaseWWTask):
         self.boss_lv_box = None
         self.boss_health_box = None
         self.boss_health = None
+        # (time, crop) of the boss health bar, newest last
+        self.boss_health_history = deque(maxlen=30)
+        self.enemy_health_tracker = HealthBarTracker(enemy_health_color_red)
+        self.boss_health_tracker = HealthBarTracker(boss_health_color)
         self.out_of_combat_reason = ""
         self.combat_check_interval = 0.5
         self.last_in_realm_not_combat = 0
         self._last_liberation = 0
         self.target_enemy_time_out = 3
         self.combat_end_condition = None
+        self._hud = None
+        self._hud_queries = None
+        self._hud_queries_shape = None
 
     @property
     def in_liberation(self):
@@ -62,6 +77,7 @@ class CombatCheck(BaseWWTask):
     def do_reset_to_false(self):
         self._in_combat = False
         self.boss_lv_mask = None
+        self.boss_lv_color = None
         self.boss_lv_template = None
         self.in_liberation = False  # return True
         self.has_count_down = False
@@ -70,6 +86,9 @@ class CombatCheck(BaseWWTask):
         self.boss_lv_box = None
         self.boss_health = None
         self.boss_health_box = None
+        self.boss_health_history.clear()
+        self.enemy_health_tracker.reset()
+        self.boss_health_tracker.reset()
         self.last_in_realm_not_combat = 0
         return False
 
@@ -103,6 +122,29 @@ class CombatCheck(BaseWWTask):
                 logger.info(f'set count_down to {self.has_count_down}  {numbers} {count_down:.2f}%')
             return self.has_count_down
 
+    @property
+    def hud(self):
+        """
+        HudState of the current frame, measured once and reused until the next frame is captured.
+        """
+        if self._hud is None or self._hud.frame is not self.frame:
+            self._hud = HudState(self.frame, self.hud_queries(), self.screen_height)
+        return self._hud
+
+    def hud_queries(self):
+        # the boxes only change with the resolution
+        if self._hud_queries_shape != self.frame.shape[:2]:
+            queries = {name: (text_white_color, self.get_box_by_name(f'box_{name}')) for name in
+                       ('resonance', 'echo', 'liberation', 'target_mouse')}
+            for name in ('target_enemy', 'target_enemy_inner', 'target_enemy_long', 'target_enemy_long_inner'):
+                queries[name] = (aim_color, self.get_box_by_name(f'box_{name}'))
+            queries['forte_full'] = (forte_white_color,
+                                     self.box_of_screen_scaled(3840, 2160, 2251, 1993, 2311, 2016, name='forte_full',
+                                                               hcenter=True))
+            self._hud_queries = queries
+            self._hud_queries_shape = self.frame.shape[:2]
+        return self._hud_queries
+
     @property
     def target_area_box(self):
         return self.box_of_screen(0.1, 0.10, 0.9, 0.9, hcenter=True, name="target_area_box")
@@ -156,13 +198,9 @@ class CombatCheck(BaseWWTask):
         return lvs
 
     def check_target_enemy_btn(self):
-        if self.calculate_color_percentage(text_white_color,
-                                           self.get_box_by_name(
-                                               'box_target_mouse')) == 0:
+        if self.hud['target_mouse'] == 0:
             logger.info(f'check target_enemy failed, wait 3 seconds')
-            if self.wait_until(lambda: self.calculate_color_percentage(text_white_color,
-                                                                       self.get_box_by_name('box_target_mouse')) != 0,
-                               time_out=5):
+            if self.wait_until(lambda: self.hud['target_mouse'] != 0, time_out=5):
                 return True
             self.log_error(
                 "Auto combat error: Make sure you're equipping echos and turn off effect that changes the game color, (Game Gammar/Nvidia AMD Game Filter), turn off Motion Blur in game video options"
@@ -171,13 +209,13 @@ class CombatCheck(BaseWWTask):
 
     def has_target(self):
         if self.has_long_actionbar_chars():
-            outer_box = 'box_target_enemy_long'
-            inner_box = 'box_target_enemy_long_inner'
+            outer_box = 'target_enemy_long'
+            inner_box = 'target_enemy_long_inner'
         else:
-            outer_box = 'box_target_enemy'
-            inner_box = 'box_target_enemy_inner'
-        aim_percent = self.calculate_color_percentage(aim_color, self.get_box_by_name(outer_box))
-        aim_inner_percent = self.calculate_color_percentage(aim_color, self.get_box_by_name(inner_box))
+            outer_box = 'target_enemy'
+            inner_box = 'target_enemy_inner'
+        aim_percent = self.hud[outer_box]
+        aim_inner_percent = self.hud[inner_box]
         # logger.debug(f'box_target_enemy yellow percent {aim_percent} {aim_inner_percent}')
         if aim_percent - aim_inner_percent > 0.02:
             return True
@@ -211,19 +249,21 @@ class CombatCheck(BaseWWTask):
             max_height = min_height * 3
             min_width = self.width_of_screen(100 / 3840)
 
-        boxes = find_color_rectangles(self.frame, enemy_health_color_red, min_width, min_height, max_height=max_height)
+        boxes = self.enemy_health_tracker.find(self.frame, min_width, min_height, max_height=max_height)
 
         if len(boxes) > 0:
             self.draw_boxes('enemy_health_bar_red', boxes, color='blue')
             return True
         else:
-            boxes = find_color_rectangles(self.frame, boss_health_color, min_width, min_height * 1.3,
-                                          box=self.box_of_screen(1269 / 3840, 58 / 2160, 2533 / 3840, 200 / 2160))
+            boxes = self.boss_health_tracker.find(self.frame, min_width, min_height * 1.3,
+                                                  box=self.box_of_screen(1269 / 3840, 58 / 2160, 2533 / 3840,
+                                                                         200 / 2160))
             if len(boxes) == 1:
-                self.boss_health_box = boxes[0]
-                self.boss_health_box.width = 10
-                self.boss_health_box.x += 6
-                self.boss_health = self.boss_health_box.crop_frame(self.frame)
+                # the tracker keeps the found boxes, adjust a copy
+                self.boss_health_box = boxes[0].copy(x_offset=6, width_offset=10 - boxes[0].width)
+                # a copy, a view would keep every frame of the history alive
+                self.boss_health = self.boss_health_box.crop_frame(self.frame).copy()
+                self.boss_health_history.append((time.time(), self.boss_health))
                 self.draw_boxes('boss_health', boxes, color='blue')
                 return True
         return False
@@ -231,9 +271,24 @@ class CombatCheck(BaseWWTask):
     def check_health_bar(self):
         if self.has_health_bar():
             return True
+        elif self.boss_lv_template is not None and self.match_boss_lv_template():
+            return True
         else:
             return self.find_boss_lv_text()
 
+    def match_boss_lv_template(self, threshold=0.8):
+        """
+        Check the boss Lv. text found by find_boss_lv_text is still there by matching its cached text mask around the
+        same place, much cheaper than running the OCR again.
+        """
+        template_h, template_w = self.boss_lv_mask.shape[:2]
+        margin_x, margin_y = max(int(template_w * 0.2), 4), max(int(template_h * 0.5), 4)
+        area = self.boss_lv_box.copy(x_offset=-margin_x, y_offset=-margin_y, width_offset=margin_x * 2,
+                                     height_offset=margin_y * 2, name='boss_lv_area')
+        max_val = match_text_mask(area.crop_frame(self.frame), self.boss_lv_mask, self.boss_lv_color)
+        logger.debug(f'match_boss_lv_template {max_val:.2f}')
+        return max_val >= threshold
+
     def find_boss_lv_text(self):
         texts = self.ocr(box=self.box_of_screen(1269 / 3840, 10 / 2160, 2533 / 3840, 140 / 2160, hcenter=True),
                          target_height=540, name='boss_lv_text')
@@ -254,16 +309,39 @@ class CombatCheck(BaseWWTask):
 
     def keep_boss_text_white(self):
         cropped = self.boss_lv_box.crop_frame(self.frame)
-        mask, area = get_mask_in_color_range(cropped, boss_white_text_color)
-        if area / mask.shape[0] * mask.shape[1] < 0.05:
-            mask, area = get_mask_in_color_range(cropped, boss_orange_text_color)
-            if area / mask.shape[0] * mask.shape[1] < 0.05:
-                mask, area = get_mask_in_color_range(cropped,
-                                                     boss_red_text_color)
-                if area / mask.shape[0] * mask.shape[1] < 0.05:
-                    logger.error(f'keep_boss_text_white cant find text with the correct color')
-                    return None, 0
-        return cropped, mask
+        mask, self.boss_lv_color = boss_text_mask(cropped)
+        if mask is None:
+            logger.error(f'keep_boss_text_white cant find text with the correct color')
+            return None, 0
+        return cropped.copy(), mask
+
+
+def boss_text_mask(cropped):
+    """
+    Returns:
+        tuple: the mask of the boss Lv. text and its color, white, orange or red, (None, None) if none is found
+    """
+    for color in (boss_white_text_color, boss_orange_text_color, boss_red_text_color):
+        mask, area = get_mask_in_color_range(cropped, color)
+        if area / mask.shape[0] * mask.shape[1] >= 0.05:
+            return mask, color
+    return None, None
+
+
+def match_text_mask(image, mask, color):
+    """
+    Matches the text mask against the pixels of image in the text color. The text is a flat color, a masked match of
+    the color crop has no variance under the mask and scores 0, the binarized image doesn't.
+
+    Returns:
+        float: the best TM_CCORR_NORMED score, 0 if image is smaller than the mask
+    """
+    if image.shape[0] < mask.shape[0] or image.shape[1] < mask.shape[1]:
+        return 0
+    binary = cv2.inRange(image, *color_range_to_bound(color))
+    result = cv2.matchTemplate(binary, mask, cv2.TM_CCORR_NORMED)
+    # nan where the window has no pixel of the color
+    return float(np.max(np.nan_to_num(result, nan=0, posinf=0, neginf=0)))
 
 
 count_down_re = re.compile(r'\d\d')
@@ -0,0 +1,60 @@
+import time
+
+from ok import Box, find_color_rectangles
+
+
+class HealthBarTracker:
+    """
+    Finds health bar rectangles of one color, searching around the bars found last time before scanning the whole
+    search area.
+
+    The neighbourhood is the bounding rect of the last bars grown by margin (a fraction of the frame size). The
+    whole area is scanned when nothing is tracked, the neighbourhood search finds nothing, or every
+    full_scan_interval seconds, so new bars away from the tracked ones still show up.
+    """
+
+    def __init__(self, color, margin=0.08, full_scan_interval=1.0):
+        self.color = color
+        self.margin = margin
+        self.full_scan_interval = full_scan_interval
+        self.boxes = []
+        self.last_full_scan = 0
+        self.tracked_count = 0
+        self.full_scan_count = 0
+
+    def reset(self):
+        self.boxes = []
+        self.last_full_scan = 0
+
+    def find(self, frame, min_width, min_height, max_height=None, box=None):
+        """
+        Same arguments and result as find_color_rectangles, box is the full search area, None for the whole frame.
+        """
+        now = time.time()
+        if self.boxes and now - self.last_full_scan < self.full_scan_interval:
+            neighbourhood = self.neighbourhood(frame, box)
+            if neighbourhood is not None:
+                boxes = find_color_rectangles(frame, self.color, min_width, min_height, max_height=max_height,
+                                              box=neighbourhood)
+                if boxes:
+                    self.tracked_count += 1
+                    self.boxes = boxes
+                    return boxes
+        self.full_scan_count += 1
+        self.last_full_scan = now
+        self.boxes = find_color_rectangles(frame, self.color, min_width, min_height, max_height=max_height, box=box)
+        return self.boxes
+
+    def neighbourhood(self, frame, box):
+        frame_h, frame_w = frame.shape[:2]
+        margin_x, margin_y = int(frame_w * self.margin), int(frame_h * self.margin)
+        x = max(min(b.x for b in self.boxes) - margin_x, 0)
+        y = max(min(b.y for b in self.boxes) - margin_y, 0)
+        to_x = min(max(b.x + b.width for b in self.boxes) + margin_x, frame_w)
+        to_y = min(max(b.y + b.height for b in self.boxes) + margin_y, frame_h)
+        if box is not None:
+            x, y = max(x, box.x), max(y, box.y)
+            to_x, to_y = min(to_x, box.x + box.width), min(to_y, box.y + box.height)
+        if to_x <= x or to_y <= y:
+            return None
+        return Box(x, y, to_x - x, to_y - y, name='health_bar_neighbourhood')
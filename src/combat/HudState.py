@@ -0,0 +1,108 @@
+import cv2
+import numpy as np
+
+from ok import get_connected_area_by_color, color_range_to_bound
+from src.char.BaseChar import dot_color
+
+skill_names = ('resonance', 'echo', 'liberation')
+
+
+class HudState:
+    """
+    Color percentages of the combat HUD boxes (skills, forte, target) in one frame.
+
+    Each box is thresholded on its own crop with cv2.inRange, a union rect of the boxes is mostly pixels no box
+    queries and a LUT classification of it costs more than all the small inRange calls. The percentages equal
+    calculate_color_percentage on the single box. Everything is measured on creation, the task creates one per
+    captured frame and every check of that frame reads it.
+    """
+
+    def __init__(self, frame, queries, screen_height=None):
+        """
+        queries: {name: (color_range, box)}, must include the resonance, echo and liberation boxes for cooldown()
+        """
+        self.frame = frame
+        self.screen_height = screen_height or frame.shape[0]
+        self._cooldowns = None
+        self.boxes = {name: box for name, (_, box) in queries.items()}
+        self.percentages = {}
+        bounds = {}
+        for name, (color, box) in queries.items():
+            bound = bounds.get(id(color))
+            if bound is None:
+                bound = bounds[id(color)] = color_range_to_bound(color)
+            cropped = box.crop_frame(frame)
+            self.percentages[name] = cv2.countNonZero(cv2.inRange(cropped, *bound)) / (
+                    cropped.shape[0] * cropped.shape[1]) if cropped.size else 0
+
+    def __getitem__(self, name):
+        return self.percentages[name]
+
+    def cooldown(self, name):
+        """
+        SkillCooldown of the resonance, echo or liberation box, all three are labeled together on the first call.
+        """
+        if self._cooldowns is None:
+            self._cooldowns = skill_cooldowns(self.frame, {name: self.boxes[name] for name in skill_names},
+                                              self.screen_height)
+        return self._cooldowns[name]
+
+
+class SkillCooldown:
+    """
+    The connected components of a skill box, a skill in cooldown shows 2 or 3 digits with a dot below.
+    """
+
+    def __init__(self, has_dot=False, number_count=0, invalid=False):
+        self.has_dot = has_dot
+        self.number_count = number_count
+        # a component touches the border of the box, it's not a cooldown number
+        self.invalid = invalid
+
+    @property
+    def has_cd(self):
+        return not self.invalid and self.has_dot and 2 <= self.number_count <= 3
+
+    def __repr__(self):
+        return f'SkillCooldown(has_dot={self.has_dot}, number_count={self.number_count}, invalid={self.invalid})'
+
+
+def skill_cooldowns(frame, boxes, screen_height):
+    """
+    Label the dot_color components of all skill boxes with one connected component pass.
+
+    The crops are placed side by side with a black column in between, so no component can cross from one box into
+    the next and every box gets the same components as labeling its crop alone.
+
+    Returns:
+        dict: {name: SkillCooldown}
+    """
+    crops = {name: box.crop_frame(frame) for name, box in boxes.items()}
+    height = max(crop.shape[0] for crop in crops.values())
+    width = sum(crop.shape[1] + 1 for crop in crops.values())
+    strip = np.zeros((height, width, 3), dtype=frame.dtype)
+    offsets = {}
+    x = 0
+    for name, crop in crops.items():
+        strip[:crop.shape[0], x:x + crop.shape[1]] = crop
+        offsets[name] = x
+        x += crop.shape[1] + 1
+    num_labels, stats, _ = get_connected_area_by_color(strip, dot_color, connectivity=8, gray_range=22)
+    stats = stats[1:num_labels].astype(np.int64)
+    frame_area = frame.shape[0] * frame.shape[1]
+    cooldowns = {}
+    for name, box in boxes.items():
+        crop_w = crops[name].shape[1]
+        offset = offsets[name]
+        own = stats[(stats[:, 0] >= offset) & (stats[:, 0] < offset + crop_w)]
+        left, top, width, height, area = own[:, 0] - offset, own[:, 1], own[:, 2], own[:, 3], own[:, 4]
+        inside = (left > 0) & (top > 0) & (left + width < box.width) & (top + height < box.height)
+        area_ratio = area / frame_area
+        dot = (16 / 3840 / 2160 <= area_ratio) & (area_ratio <= 90 / 3840 / 2160) & \
+              (np.abs(width - height) / (width + height) < 0.3) & (top / crops[name].shape[0] > 0.6)
+        number = ~dot & (25 / 2160 <= height / screen_height) & (height / screen_height <= 45 / 2160) & \
+                 (5 / 2160 <= width / screen_height) & (width / screen_height <= 35 / 2160)
+        cooldowns[name] = SkillCooldown(has_dot=bool((inside & dot).any()),
+                                        number_count=int((inside & number).sum()),
+                                        invalid=not inside.all())
+    return cooldowns
@@ -0,0 +1,87 @@
+import math
+
+import cv2
+import numpy as np
+
+from ok import Logger
+from src.ColorClassifier import ColorClassifier
+
+logger = Logger.get_logger(__name__)
+
+
+class RingDetector:
+    """
+    Finds the concerto ring of every element color in the con_full box.
+
+    All colors are classified in one ColorClassifier pass. Per color the components smaller than min_area are
+    dropped by their stats before any mask is built, and the contour check of the rest runs on the component's
+    bounding rect instead of the whole box. A color with fewer pixels than the smallest possible big component is not
+    labeled at all. Results are cached for the current frame.
+    """
+
+    def __init__(self, colors):
+        self.colors = colors
+        self.classifier = ColorClassifier(colors)
+        self._frame = None
+        self._key = None
+        self._planes = None
+        self._results = {}
+
+    def rings(self, frame, box, min_area, color_index):
+        """
+        Returns:
+            tuple: (area, is_full) of the ring in colors[color_index], area of the last big component,
+                (0, False) if there is more than one.
+        """
+        key = (box.x, box.y, box.width, box.height, min_area)
+        if frame is not self._frame or key != self._key:
+            self._frame = frame
+            self._key = key
+            self._planes = self.classifier.classify(box.crop_frame(frame))
+            self._results = {}
+        result = self._results.get(color_index)
+        if result is None:
+            # the color's bit is enough, connected components take every nonzero pixel as foreground
+            plane, bit = self.classifier.bit(self.colors[color_index])
+            result = count_rings(cv2.bitwise_and(self._planes[plane], bit), min_area)
+            self._results[color_index] = result
+        return result
+
+
+def count_rings(mask, min_area):
+    """
+    mask: nonzero where the pixel has the ring color
+    """
+    # an 8 connected component spans its bounding rect, so it has at least max(w, h) >= sqrt(w * h) pixels
+    if cv2.countNonZero(mask) < math.sqrt(min_area):
+        return 0, False
+    # 16 bit labels are enough for a small box and label faster, at most a quarter of the pixels are components
+    ltype = cv2.CV_16U if mask.size < 4 * 65000 else cv2.CV_32S
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(mask, 8, ltype, cv2.CCL_DEFAULT)
+    big = np.flatnonzero(stats[1:, 2] * stats[1:, 3] >= min_area) + 1
+    if len(big) > 1:
+        logger.warning(f'is_con_full found multiple rings {len(big)}')
+        return 0, False
+    if len(big) == 0:
+        return 0, False
+    label = int(big[0])
+    x, y, width, height, area = stats[label, :5]
+    # one pixel of margin, except where the component touches the image border, keeps findContours identical
+    x0, y0 = max(x - 1, 0), max(y - 1, 0)
+    x1, y1 = min(x + width + 1, mask.shape[1]), min(y + height + 1, mask.shape[0])
+    component_mask = (labels[y0:y1, x0:x1] == label).astype(np.uint8) * 255
+    return area, is_full_ring(component_mask)
+
+
+def is_full_ring(component_mask):
+    contours, _ = cv2.findContours(component_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if len(contours) != 1:
+        return False
+    contour = contours[0]
+    # Approximate the contour with polygons.
+    epsilon = 0.05 * cv2.arcLength(contour, True)
+    approx = cv2.approxPolyDP(contour, epsilon, True)
+    # Check if the polygon is closed (has no gaps) and has a reasonable number of vertices for a ring.
+    if not cv2.isContourConvex(approx) or len(approx) < 4:
+        return False
+    return True
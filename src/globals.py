@@ -1,32 +1,125 @@
 import os.path
+import threading
 from os import path
 
 import cv2
 from PySide6.QtCore import Signal, QObject
 
+from config import inference_config
 from ok import Config, Logger, get_path_relative_to_exe
-from src.OpenVinoYolo8Detect import OpenVinoYolo8Detect
+from src.OpenVinoYolo8Detect import OpenVinoYolo8Detect, region_key
 
 logger = Logger.get_logger(__name__)
 
+default_yolo_input_size = 640
+yolo_cache_dir = get_path_relative_to_exe(os.path.join("cache", "openvino"))
+
 
 class Globals(QObject):
 
     def __init__(self, exit_event):
         super().__init__()
-        self._yolo_model = None
+        self._yolo_models = {}
+        self._yolo_lock = threading.Lock()
+        self._yolo_cache_frame = None
+        self._yolo_cache = {}
+        self.yolo_cache_hits = 0
+        self.yolo_cache_misses = 0
+        self.in_team_calls = 0
+        self.in_team_memo_hits = 0
+        self.in_team_skipped_matches = 0
+        self.in_team_match_cost = 0
+        self.in_team_time_saved = 0
         self.mini_map_arrow = None
         self.logged_in = False
+        # compile at app start, so the first find_echos in combat does not stall on it
+        threading.Thread(target=self._load_yolo_model, name='yolo_model_loader', daemon=True).start()
+
+    def _load_yolo_model(self):
+        try:
+            self.yolo_model.warm_up()
+        except Exception as e:
+            logger.error('background yolo model loading failed', e)
 
     @property
     def yolo_model(self):
-        if self._yolo_model is None:
-            self._yolo_model =  OpenVinoYolo8Detect(weights=get_path_relative_to_exe(os.path.join("assets", "echo_model", "best.xml")))
-        return self._yolo_model
+        return self.get_yolo_model(default_yolo_input_size)
+
+    def get_yolo_model(self, input_size=default_yolo_input_size):
+        """
+        The echo model compiled for an input_size x input_size input, compiled once per size and cached.
+
+        Uses assets/echo_model/best_{input_size}.xml if exported, otherwise tries to reshape best.xml.
+        With Echo Model INT8 the _int8 variants of these files are preferred if they exist.
+        Falls back to the default size if the model can not run at input_size.
+        Waits for the background compilation if it's still running.
+        """
+        model = self._yolo_models.get(input_size)
+        if model is None:
+            with self._yolo_lock:
+                model = self._yolo_models.get(input_size)
+                if model is None:
+                    model = self._create_yolo_model(input_size)
+                    self._yolo_models[input_size] = model
+        return model
+
+    def _create_yolo_model(self, input_size):
+        weights = yolo_weights(input_size)
+        try:
+            return OpenVinoYolo8Detect(weights=weights, model_h=input_size, model_w=input_size,
+                                       embed_preprocess=True, cache_dir=yolo_cache_dir,
+                                       threads=inference_config['Detector Threads'],
+                                       streams=inference_config['Detector Streams'],
+                                       performance_hint=inference_config['Detector Performance Hint'])
+        except RuntimeError as e:
+            if input_size == default_yolo_input_size:
+                raise
+            logger.error(f'yolo model can not run at input size {input_size}, use {default_yolo_input_size}', e)
+            if default_yolo_input_size not in self._yolo_models:
+                self._yolo_models[default_yolo_input_size] = self._create_yolo_model(default_yolo_input_size)
+            return self._yolo_models[default_yolo_input_size]
+
+    def yolo_detect(self, image, threshold=0.6, label=-1, box=None, input_size=default_yolo_input_size):
+        """
+        box: only detect inside this region of interest, the returned boxes are still in frame coordinates
+        input_size: the model input size, a small size on a small region is much cheaper
+        """
+        key = (threshold, label, region_key(box), input_size)
+        boxes = self._get_cached_detection(image, key)
+        if boxes is None:
+            boxes = self.get_yolo_model(input_size).detect(image, threshold=threshold, label=label, box=box)
+            self._cache_detection(image, key, boxes)
+        return boxes
+
+    def _get_cached_detection(self, image, key):
+        """
+        The detection cache only holds the results of the last frame, keyed by the frame object itself.
+        The frame is kept referenced, so a new frame can never get the same identity while it is cached.
+        """
+        if image is self._yolo_cache_frame and key in self._yolo_cache:
+            self.yolo_cache_hits += 1
+            return self._yolo_cache[key]
+        self.yolo_cache_misses += 1
+        return None
+
+    def _cache_detection(self, image, key, boxes):
+        if image is not self._yolo_cache_frame:
+            self._yolo_cache_frame = image
+            self._yolo_cache = {}
+        self._yolo_cache[key] = boxes
 
-    def yolo_detect(self, image, threshold=0.6, label=-1):
-        return self.yolo_model.detect(image, threshold=threshold, label=label)
 
+def yolo_weights(input_size):
+    candidates = [f"best_{input_size}.xml", "best.xml"]
+    if inference_config['Echo Model'] == 'INT8':
+        candidates = [f"best_int8_{input_size}.xml", "best_int8.xml"] + candidates
+    for name in candidates:
+        weights = get_path_relative_to_exe(os.path.join("assets", "echo_model", name))
+        if os.path.exists(weights):
+            if inference_config['Echo Model'] == 'INT8' and 'int8' not in name:
+                logger.warning(f'INT8 echo model not found, use {name}')
+            return weights
+    return weights
 
 
 if __name__ == "__main__":
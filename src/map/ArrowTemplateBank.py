@@ -0,0 +1,108 @@
+import cv2
+import numpy as np
+
+
+class ArrowTemplateBank:
+    """
+    The minimap arrow template rotated clockwise by every whole degree, precomputed once so a heading query only runs
+    cv2.matchTemplate and never warps.
+
+    The score is the TM_CCOEFF_NORMED of cv2.matchTemplate masked to the disk inscribed in the template. The disk
+    rotates into itself, so every rotation shares the mask and the corners warpAffine fills with black are left out.
+    With a shared mask the statistics of the search windows are computed once per query, and each rotation, kept zero
+    mean inside the disk, is one plain TM_CCORR. The cost of a match grows with the template area times the search
+    area, so templates larger than max_size are rotated and matched downscaled to max_size, the locations are scaled
+    back to the frame. Build one per resolution.
+    """
+
+    def __init__(self, template, angle_count=360, max_size=40):
+        self.shape = template.shape
+        self.angle_count = angle_count
+        self.angles = np.arange(angle_count) * 360 / angle_count
+        self.height, self.width = template.shape[:2]
+        self.scale = min(1.0, max_size / max(self.height, self.width))
+        template = self.resize(template)
+        h, w = template.shape[:2]
+        self.channels = template.shape[2] if template.ndim == 3 else 1
+        center = (w // 2, h // 2)
+        self.mask = np.zeros((h, w), dtype=np.uint8)
+        cv2.circle(self.mask, center, min(center[0], center[1], w - 1 - center[0], h - 1 - center[1]), 255, -1)
+        inside = self.mask > 0
+        self.mask_count = int(inside.sum())
+        self.mask_float = inside.astype(np.float32)
+        self.templates = []
+        self.template_norms = np.empty(angle_count, dtype=np.float64)
+        for i, angle in enumerate(self.angles):
+            rotation_matrix = cv2.getRotationMatrix2D(center, -angle, 1.0)
+            rotated = cv2.warpAffine(template, rotation_matrix, (w, h)).reshape(h, w, self.channels)
+            rotated = rotated.astype(np.float32)
+            # zero mean inside the mask, so the mean of the window cancels out of the correlation
+            rotated = (rotated - rotated[inside].mean(axis=0)) * self.mask_float[:, :, None]
+            self.templates.append(rotated)
+            self.template_norms[i] = max(np.sqrt(np.sum(rotated.astype(np.float64) ** 2)), 1e-3)
+
+    def resize(self, image):
+        if self.scale == 1:
+            return image
+        return cv2.resize(image, (max(1, int(round(image.shape[1] * self.scale))),
+                                  max(1, int(round(image.shape[0] * self.scale)))), interpolation=cv2.INTER_AREA)
+
+    def window_norms(self, image):
+        """
+        Returns:
+            numpy.ndarray: the norm of every search window minus its mean inside the mask, like the result of
+                cv2.matchTemplate
+        """
+        energy = 0
+        for c in range(self.channels):
+            plane = np.ascontiguousarray(image[:, :, c])
+            window_sum = cv2.matchTemplate(plane, self.mask_float, cv2.TM_CCORR)
+            energy = energy + cv2.matchTemplate(plane * plane, self.mask_float, cv2.TM_CCORR) - \
+                     window_sum * window_sum / self.mask_count
+        return np.sqrt(np.maximum(energy, 0))
+
+    def scores(self, image, indices=None):
+        """
+        Args:
+            image: the search area, at least as large as the template
+            indices: the rotations to score, all of them if None
+
+        Returns:
+            numpy.ndarray: (len(indices), result height, result width) like the result of cv2.matchTemplate, on the
+                downscaled search area, see location()
+        """
+        if indices is None:
+            indices = np.arange(self.angle_count)
+        indices = np.asarray(indices) % self.angle_count
+        image = self.resize(image)
+        image = image.reshape(image.shape[0], image.shape[1], -1).astype(np.float32)
+        # the score ignores a constant offset, centering keeps the float32 sums of squares precise
+        image -= image.reshape(-1, self.channels).mean(axis=0)
+        window_norms = self.window_norms(image)
+        # a window with no variance scores 0, like the nan cv2.matchTemplate gives for it
+        window_norms[window_norms < 1e-3] = np.inf
+        h, w = self.templates[0].shape[:2]
+        scores = np.empty((len(indices), image.shape[0] - h + 1, image.shape[1] - w + 1), dtype=np.float32)
+        for row, index in enumerate(indices):
+            numerator = cv2.matchTemplate(image, self.templates[index], cv2.TM_CCORR)
+            scores[row] = numerator / (window_norms * self.template_norms[index])
+        return np.clip(scores, -1, 1, out=scores)
+
+    def location(self, x, y):
+        """
+        Returns:
+            tuple: (x, y) in the search area of the score at x, y
+        """
+        return int(round(x / self.scale)), int(round(y / self.scale))
+
+    def match(self, image, indices=None):
+        """
+        Returns:
+            tuple: (angle, confidence, (x, y)) of the best scoring rotation and its location in image
+        """
+        if indices is None:
+            indices = np.arange(self.angle_count)
+        indices = np.asarray(indices) % self.angle_count
+        scores = self.scores(image, indices)
+        best, y, x = np.unravel_index(int(np.argmax(scores)), scores.shape)
+        return float(self.angles[indices[best]]), float(scores[best, y, x]), self.location(x, y)
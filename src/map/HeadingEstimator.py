@@ -0,0 +1,88 @@
+import numpy as np
+
+
+class HeadingEstimator:
+    """
+    Tracks the minimap arrow heading with an ArrowTemplateBank, the heading barely changes between two queries.
+
+    Only the rotations within window degrees of the last heading are scored first. The whole circle is scored when
+    there is no last heading, the best score is below widen_confidence, or the best rotation is on the edge of the
+    window (the arrow turned further than the window). The heading is refined below one degree with a parabola through
+    the best rotation and its two neighbours. An estimate scoring below min_confidence is not reliable.
+    """
+
+    def __init__(self, bank, window=15, widen_confidence=0.6, min_confidence=0.3):
+        self.bank = bank
+        self.window = window
+        self.widen_confidence = widen_confidence
+        self.min_confidence = min_confidence
+        self.angle = None
+        self.confidence = 0
+        self.location = None
+        self.narrow_count = 0
+        self.full_count = 0
+
+    def reset(self):
+        self.angle = None
+        self.confidence = 0
+        self.location = None
+
+    @property
+    def reliable(self):
+        return self.angle is not None and self.confidence >= self.min_confidence
+
+    def estimate(self, image):
+        """
+        Args:
+            image: the arrow search area
+
+        Returns:
+            tuple: (angle, confidence), angle clockwise in degrees [0, 360), None if nothing scores above 0
+        """
+        step = 360 / self.bank.angle_count
+        result = None
+        if self.angle is not None:
+            center = int(round(self.angle / step))
+            half = max(int(round(self.window / step)), 1)
+            result = self.search(image, np.arange(center - half, center + half + 1))
+            best = int(np.argmax(result[1]))
+            if result[1][best] < self.widen_confidence or best == 0 or best == len(result[0]) - 1:
+                result = None
+            else:
+                self.narrow_count += 1
+        if result is None:
+            self.full_count += 1
+            result = self.search(image, np.arange(self.bank.angle_count))
+        indices, confidences, locations = result
+        best = int(np.argmax(confidences))
+        self.confidence = float(confidences[best])
+        if self.confidence <= 0:
+            self.reset()
+            return None, 0
+        self.location = locations[best]
+        self.angle = float(indices[best] * step + refine(confidences, best) * step) % 360
+        return self.angle, self.confidence
+
+    def search(self, image, indices):
+        """
+        Returns:
+            tuple: (indices, best score of each rotation, (x, y) of each best score)
+        """
+        scores = self.bank.scores(image, indices)
+        flat = scores.reshape(len(indices), -1)
+        positions = np.argmax(flat, axis=1)
+        confidences = flat[np.arange(len(indices)), positions]
+        ys, xs = np.unravel_index(positions, scores.shape[1:])
+        return indices, confidences, [self.bank.location(x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+
+
+def refine(values, index):
+    """
+    Offset in [-0.5, 0.5] of the peak of the parabola through values[index - 1: index + 2], wrapping around the ends,
+    the best rotation is only on an end when values cover the whole circle.
+    """
+    left, center, right = values[index - 1], values[index], values[(index + 1) % len(values)]
+    denominator = left - 2 * center + right
+    if denominator >= 0:
+        return 0.0
+    return float(np.clip(0.5 * (left - right) / denominator, -0.5, 0.5))
@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+
+from ok import Box
+
+# FLANN_INDEX_LSH, the index for binary descriptors like ORB
+flann_index_lsh = 6
+
+
+class KeypointLocalizer:
+    """
+    Finds the minimap anywhere on the big map with ORB keypoints, no matter where it was last seen.
+
+    The ORB descriptors of the big map are indexed once in a FLANN LSH index. A query detects the keypoints of the
+    masked minimap, keeps the nearest neighbours passing the ratio test, and estimates a similarity transform with
+    RANSAC. The transform must keep the scale close to 1, the minimap and the big map are at the same zoom. The cost
+    is bounded by the feature counts, not by the size of the search area. The big map keeps many features, the
+    strongest few thousand cluster on the busiest parts of the map and leave the rest without any.
+    """
+
+    def __init__(self, big_map, features=50000, query_features=500, ratio=0.75, min_inliers=8):
+        self.ratio = ratio
+        self.min_inliers = min_inliers
+        self.orb = cv2.ORB_create(nfeatures=features)
+        self.query_orb = cv2.ORB_create(nfeatures=query_features)
+        self.keypoints, self.descriptors = self.orb.detectAndCompute(to_gray(big_map), None)
+        self.matcher = None
+        if self.descriptors is not None and len(self.keypoints) >= min_inliers:
+            self.points = np.float32([keypoint.pt for keypoint in self.keypoints])
+            self.matcher = cv2.FlannBasedMatcher(
+                dict(algorithm=flann_index_lsh, table_number=6, key_size=12, multi_probe_level=1), dict(checks=50))
+            self.matcher.add([self.descriptors])
+            self.matcher.train()
+
+    def locate(self, template, mask=None):
+        """
+        Returns:
+            Box: where template is on the big map, confidence is the inlier ratio of the matches, None if not found
+        """
+        if self.matcher is None:
+            return None
+        keypoints, descriptors = self.query_orb.detectAndCompute(to_gray(template), mask)
+        if descriptors is None or len(keypoints) < self.min_inliers:
+            return None
+        good = [pair[0] for pair in self.matcher.knnMatch(descriptors, k=2)
+                if len(pair) == 2 and pair[0].distance < self.ratio * pair[1].distance]
+        if len(good) < self.min_inliers:
+            return None
+        source = np.float32([keypoints[m.queryIdx].pt for m in good])
+        target = self.points[[m.trainIdx for m in good]]
+        transform, inliers = cv2.estimateAffinePartial2D(source, target, method=cv2.RANSAC,
+                                                         ransacReprojThreshold=5.0)
+        if transform is None or int(inliers.sum()) < self.min_inliers:
+            return None
+        scale = float(np.hypot(transform[0, 0], transform[1, 0]))
+        if not 0.8 <= scale <= 1.25:
+            return None
+        h, w = template.shape[:2]
+        center_x, center_y = transform @ np.array([w / 2, h / 2, 1])
+        return Box(int(round(center_x - w / 2)), int(round(center_y - h / 2)), w, h,
+                   confidence=float(inliers.sum()) / len(good), name='in_big_map')
+
+
+def to_gray(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
@@ -0,0 +1,120 @@
+import cv2
+import numpy as np
+
+from ok import Box
+
+
+class MapLocalizer:
+    """
+    Finds the minimap on the big map, coarse to fine.
+
+    The big map pyramid is built once, levels times halved. The masked minimap is matched on the coarsest level
+    first, then the best coarse matches are refined at full resolution in a window of one coarse pixel around
+    each. The score is the masked TM_CCOEFF_NORMED find_one uses, so the result is the full resolution match near
+    the coarse peaks without matching the whole search area at full resolution.
+    """
+
+    def __init__(self, big_map, mask, levels=2, candidates=3, candidate_margin=0.1):
+        """
+        mask: the uint8 minimap mask, 0 where the minimap is ignored
+        candidates: at most this many coarse matches scoring within candidate_margin of the best are refined
+        """
+        self.mask = mask
+        self.levels = levels
+        self.candidates = candidates
+        self.candidate_margin = candidate_margin
+        self.pyramid = [big_map]
+        for _ in range(levels):
+            self.pyramid.append(cv2.pyrDown(self.pyramid[-1]))
+        self.coarse_mask = self.scale_mask(mask, levels)
+
+    @staticmethod
+    def scale_mask(mask, level):
+        h, w = mask.shape[:2]
+        scale = 2 ** level
+        return cv2.resize(mask, (max(w // scale, 1), max(h // scale, 1)), interpolation=cv2.INTER_NEAREST)
+
+    def locate(self, template, box=None, threshold=0.05):
+        """
+        Args:
+            template: the minimap crop, the size of the mask
+            box: the search area on the big map, None for the whole map
+
+        Returns:
+            Box: the best match with its confidence, None if below threshold
+        """
+        big_map = self.pyramid[0]
+        map_h, map_w = big_map.shape[:2]
+        t_h, t_w = template.shape[:2]
+        mask = self.mask if self.mask.shape[:2] == (t_h, t_w) else \
+            cv2.resize(self.mask, (t_w, t_h), interpolation=cv2.INTER_NEAREST)
+        if box is None:
+            x, y, to_x, to_y = 0, 0, map_w, map_h
+        else:
+            x, y = max(int(box.x), 0), max(int(box.y), 0)
+            to_x, to_y = min(int(box.x + box.width), map_w), min(int(box.y + box.height), map_h)
+        # the search area must hold the whole template
+        x, y = max(min(x, to_x - t_w), 0), max(min(y, to_y - t_h), 0)
+        to_x, to_y = min(max(to_x, x + t_w), map_w), min(max(to_y, y + t_h), map_h)
+        if to_x - x < t_w or to_y - y < t_h:
+            return None
+        level = self.coarse_level(to_x - x, to_y - y, t_w, t_h)
+        if level == 0:
+            best = match(big_map[y:to_y, x:to_x], template, mask, 1)[0]
+            confidence, (match_x, match_y) = best[0], (x + best[1][0], y + best[1][1])
+        else:
+            scale = 2 ** level
+            coarse_mask = self.coarse_mask if level == self.levels and mask is self.mask else \
+                self.scale_mask(mask, level)
+            coarse_template = cv2.resize(template, (coarse_mask.shape[1], coarse_mask.shape[0]),
+                                         interpolation=cv2.INTER_AREA)
+            coarse = self.pyramid[level][y // scale:to_y // scale, x // scale:to_x // scale]
+            confidence, match_x, match_y = -1, x, y
+            coarse_matches = match(coarse, coarse_template, coarse_mask, self.candidates)
+            for coarse_confidence, (coarse_x, coarse_y) in coarse_matches:
+                # only the runners-up close to the best coarse score are worth refining
+                if coarse_confidence < coarse_matches[0][0] - self.candidate_margin:
+                    break
+                center_x, center_y = x // scale * scale + coarse_x * scale, y // scale * scale + coarse_y * scale
+                window_x = min(max(center_x - scale, x), to_x - t_w)
+                window_y = min(max(center_y - scale, y), to_y - t_h)
+                window_to_x = min(max(center_x + scale, x), to_x - t_w) + t_w
+                window_to_y = min(max(center_y + scale, y), to_y - t_h) + t_h
+                window = big_map[window_y:min(window_to_y, map_h), window_x:min(window_to_x, map_w)]
+                refined, (refined_x, refined_y) = match(window, template, mask, 1)[0]
+                if refined > confidence:
+                    confidence, match_x, match_y = refined, window_x + refined_x, window_y + refined_y
+        if confidence < threshold:
+            return None
+        return Box(match_x, match_y, t_w, t_h, confidence=confidence, name='in_big_map')
+
+    def coarse_level(self, width, height, t_w, t_h):
+        # no coarse pass when the template would be too small, or the area is already a small window
+        level = self.levels
+        while level > 0 and (min(t_w, t_h) // 2 ** level < 16 or (width - t_w) * (height - t_h) < 16 * 4 ** level):
+            level -= 1
+        return level
+
+
+def match(image, template, mask, count):
+    """
+    The count best matches of the masked TM_CCOEFF_NORMED, each at least half a template apart.
+
+    Returns:
+        list: [(confidence, (x, y))]
+    """
+    result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED, mask=mask)
+    # masked normalized matching gives inf or nan where the window has no variance
+    result = np.nan_to_num(result, nan=-1, posinf=-1, neginf=-1)
+    t_h, t_w = template.shape[:2]
+    matches = []
+    for _ in range(count):
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        if max_val <= -1:
+            break
+        matches.append((float(max_val), max_loc))
+        x, y = max_loc
+        result[max(y - t_h // 2, 0):y + t_h // 2 + 1, max(x - t_w // 2, 0):x + t_w // 2 + 1] = -1
+    if not matches:
+        matches.append((-1.0, (0, 0)))
+    return matches
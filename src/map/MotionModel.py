@@ -0,0 +1,123 @@
+import math
+
+from ok import Box
+
+
+class MotionModel:
+    """
+    Dead reckoning of the character position on the big map between two localizations.
+
+    While running, the position moves along the heading at the running speed. The speed is learned from two
+    consecutive fixes taken while running straight, smoothed by smoothing. The uncertainty grows by drift times the
+    distance travelled since the last fix, and is unbounded while running with an unknown speed or heading, so the
+    caller localizes again once it's too large.
+    """
+
+    def __init__(self, drift=0.2, smoothing=0.5, straight_tolerance=10):
+        self.drift = drift
+        self.smoothing = smoothing
+        self.straight_tolerance = straight_tolerance
+        self.speed = None
+        self.fixes = 0
+        self.predictions = 0
+        self.reset()
+
+    def reset(self):
+        self.box = None
+        self.position = None
+        self.fix_time = 0
+        self.time = 0
+        self.heading = None
+        self.running = False
+        # ran straight at a constant speed since the last fix, the next fix measures the speed
+        self.straight = False
+        self.uncertainty = math.inf
+        self.predicted = False
+
+    def fix(self, box, now, jumped=False):
+        """
+        Localized at box, measures the speed if running straight since the last fix.
+
+        Args:
+            jumped: found again after losing track, like a teleport or a knockback, the move since the last fix is not
+                a run and never measures the speed
+        """
+        x, y = box.center()
+        if jumped:
+            self.straight = False
+        if self.position is not None and self.straight and self.running and now > self.fix_time:
+            fix_x, fix_y = self.box.center()
+            speed = math.hypot(x - fix_x, y - fix_y) / (now - self.fix_time)
+            self.speed = speed if self.speed is None else \
+                self.smoothing * speed + (1 - self.smoothing) * self.speed
+        self.box = box
+        self.position = (x, y)
+        self.fix_time = self.time = now
+        self.uncertainty = 0
+        self.straight = self.running
+        self.predicted = False
+        self.fixes += 1
+
+    def set_running(self, running, now):
+        self.advance(now)
+        self.running = running
+        self.straight = False
+
+    def set_heading(self, heading, now):
+        """
+        heading: clockwise degrees from east on the big map, None if unknown
+        """
+        self.advance(now)
+        if heading is None or self.heading is None or \
+                abs((heading - self.heading + 180) % 360 - 180) > self.straight_tolerance:
+            self.straight = False
+        self.heading = heading
+
+    def advance(self, now):
+        if self.position is None or now <= self.time:
+            return
+        dt = now - self.time
+        self.time = now
+        if not self.running:
+            return
+        if self.speed is None or self.heading is None:
+            self.uncertainty = math.inf
+            return
+        distance = self.speed * dt
+        x, y = self.position
+        angle = math.radians(self.heading)
+        self.position = (x + distance * math.cos(angle), y + distance * math.sin(angle))
+        self.uncertainty += distance * self.drift
+
+    def needs_fix(self, now, interval, max_uncertainty):
+        """
+        True if the last fix is older than interval seconds, or the uncertainty is above max_uncertainty.
+        """
+        self.advance(now)
+        return self.position is None or now - self.fix_time >= interval or self.uncertainty > max_uncertainty
+
+    def search_box(self, now, scale):
+        """
+        Returns:
+            Box: the last fix box scaled by scale around the predicted position, grown by the uncertainty, None if the
+                position is unknown
+        """
+        self.advance(now)
+        if self.position is None or math.isinf(self.uncertainty):
+            return None
+        x, y = self.position
+        width, height = self.box.width * scale + self.uncertainty * 2, self.box.height * scale + self.uncertainty * 2
+        return Box(int(round(x - width / 2)), int(round(y - height / 2)), int(round(width)), int(round(height)),
+                   name='search')
+
+    def predict(self, now):
+        """
+        Returns:
+            Box: the last fix box moved to the predicted position
+        """
+        self.advance(now)
+        self.predictions += 1
+        self.predicted = True
+        x, y = self.position
+        return Box(int(round(x - self.box.width / 2)), int(round(y - self.box.height / 2)), self.box.width,
+                   self.box.height, confidence=self.box.confidence, name='predicted')
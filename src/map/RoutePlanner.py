@@ -0,0 +1,167 @@
+import math
+import time
+
+import numpy as np
+
+
+class GridIndex:
+    """
+    Points bucketed in a square grid, for nearest neighbour queries that only look at the cells around the query.
+    """
+
+    def __init__(self, points, cell):
+        self.points = points
+        self.cell = max(cell, 1)
+        self.cells = {}
+        for i, (x, y) in enumerate(points):
+            self.cells.setdefault(self.key(x, y), set()).add(i)
+        keys = list(self.cells.keys()) or [(0, 0)]
+        self.bounds = (min(k[0] for k in keys), min(k[1] for k in keys), max(k[0] for k in keys),
+                       max(k[1] for k in keys))
+
+    def key(self, x, y):
+        return int(x // self.cell), int(y // self.cell)
+
+    def remove(self, i):
+        key = self.key(*self.points[i])
+        self.cells[key].discard(i)
+        if not self.cells[key]:
+            del self.cells[key]
+
+    def nearest(self, x, y, max_distance=0):
+        """
+        Returns:
+            int: index of the nearest point left, within max_distance unless it's 0, None if there is none
+        """
+        cx, cy = self.key(x, y)
+        min_kx, min_ky, max_kx, max_ky = self.bounds
+        max_ring = max(abs(cx - min_kx), abs(cx - max_kx), abs(cy - min_ky), abs(cy - max_ky))
+        best, best_distance = None, math.inf
+        for ring in range(max_ring + 1):
+            # every point outside the rings searched so far is at least ring - 1 cells away
+            if best_distance <= (ring - 1) * self.cell or not self.cells:
+                break
+            if max_distance and (ring - 1) * self.cell > max_distance:
+                break
+            for kx in range(cx - ring, cx + ring + 1):
+                for ky in (range(cy - ring, cy + ring + 1) if abs(kx - cx) == ring else (cy - ring, cy + ring)):
+                    for i in self.cells.get((kx, ky), ()):
+                        px, py = self.points[i]
+                        distance = math.hypot(px - x, py - y)
+                        if distance < best_distance or (distance == best_distance and i < best):
+                            best, best_distance = i, distance
+        if best is None or (max_distance and best_distance > max_distance):
+            return None
+        return best
+
+
+def nearest_neighbour_route(points, start_point, max_distance=0):
+    """
+    Greedy route from start_point (not included) always going to the closest point left. Stops when no point is left
+    within max_distance of the current one, 0 for no limit, the points out of reach are left out of the route.
+    """
+    if not points:
+        return []
+    centers = [p.center() for p in points]
+    if max_distance:
+        cell = max_distance
+    else:
+        xs, ys = [c[0] for c in centers], [c[1] for c in centers]
+        cell = max(max(xs) - min(xs), max(ys) - min(ys), 1) / max(math.sqrt(len(points)), 1)
+    index = GridIndex(centers, cell)
+    route = []
+    x, y = start_point.center()
+    while True:
+        i = index.nearest(x, y, max_distance)
+        if i is None:
+            break
+        index.remove(i)
+        route.append(points[i])
+        x, y = centers[i]
+    return route
+
+
+def route_length(start_point, route):
+    length = 0
+    current = start_point
+    for point in route:
+        length += current.center_distance(point)
+        current = point
+    return length
+
+
+def improve_route(start_point, route, max_distance=0, time_budget=0.1):
+    """
+    Shortens the open route from start_point with 2-opt (reverse a segment) and Or-opt (move a run of up to 3
+    points, reversed or not) until no move helps or time_budget seconds are spent. A move is only taken if every
+    new step is within max_distance, 0 for no limit.
+
+    Returns:
+        list: the points of route in the new order
+    """
+    n = len(route) + 1
+    if n < 4:
+        return list(route)
+    centers = np.array([start_point.center()] + [p.center() for p in route], dtype=np.float64)
+    distances = np.hypot(centers[:, None, 0] - centers[None, :, 0], centers[:, None, 1] - centers[None, :, 1])
+    if max_distance:
+        distances[distances > max_distance] = math.inf
+    d = distances.tolist()
+    tour = list(range(n))
+    deadline = time.time() + time_budget
+    improved = True
+    while improved and time.time() < deadline:
+        improved = two_opt(tour, d, deadline) | or_opt(tour, d, deadline)
+    return [route[i - 1] for i in tour[1:]]
+
+
+def two_opt(tour, d, deadline):
+    n = len(tour)
+    improved = False
+    for i in range(1, n - 1):
+        if time.time() > deadline:
+            break
+        a, b = tour[i - 1], tour[i]
+        for j in range(i + 1, n):
+            c = tour[j]
+            next_d = d[b][tour[j + 1]] if j + 1 < n else 0
+            current_d = d[c][tour[j + 1]] if j + 1 < n else 0
+            if d[a][c] + next_d < d[a][b] + current_d - 1e-9:
+                tour[i:j + 1] = reversed(tour[i:j + 1])
+                improved = True
+                a, b = tour[i - 1], tour[i]
+    return improved
+
+
+def or_opt(tour, d, deadline):
+    n = len(tour)
+    improved = False
+    for length in (1, 2, 3):
+        i = 1
+        while i + length <= n:
+            if time.time() > deadline:
+                return improved
+            segment = tour[i:i + length]
+            prev, after = tour[i - 1], tour[i + length] if i + length < n else None
+            first, last = segment[0], segment[-1]
+            removed_gain = d[prev][first] + (d[last][after] if after is not None else 0) - \
+                           (d[prev][after] if after is not None else 0)
+            rest = tour[:i] + tour[i + length:]
+            best_delta, best_move = -1e-9, None
+            for k in range(len(rest)):
+                p, q = rest[k], rest[k + 1] if k + 1 < len(rest) else None
+                if k == i - 1:
+                    continue
+                base = d[p][q] if q is not None else 0
+                for reverse in (False, True):
+                    head, tail = (last, first) if reverse else (first, last)
+                    delta = d[p][head] + (d[tail][q] if q is not None else 0) - base - removed_gain
+                    if delta < best_delta:
+                        best_delta, best_move = delta, (k, reverse)
+            if best_move is not None:
+                k, reverse = best_move
+                tour[:] = rest[:k + 1] + (segment[::-1] if reverse else segment) + rest[k + 1:]
+                improved = True
+            else:
+                i += 1
+    return improved
@@ -1,18 +1,15 @@
 import re
 import time
 
-import cv2
-import numpy as np
-
 from ok import Logger
-from ok import get_connected_area_by_color, color_range_to_bound
 from ok import safe_get
 from src import text_white_color
 from src.char import BaseChar
-from src.char.BaseChar import Priority, dot_color
+from src.char.BaseChar import Priority
 from src.char.CharFactory import get_char_by_pos
 from src.char.Healer import Healer
 from src.combat.CombatCheck import CombatCheck
+from src.combat.RingDetector import RingDetector
 
 logger = Logger.get_logger(__name__)
 
@@ -34,6 +31,7 @@ class BaseCombatTask(CombatCheck):
         self.key_config = self.get_global_config('Game Hotkey Config')
         self.mouse_pos = None
         self.combat_start = 0
+        self.ring_detector = RingDetector(con_colors)
 
         self.char_texts = ['char_1_text', 'char_2_text', 'char_3_text']
         self.add_text_fix({'Ｅ': 'e'})
@@ -93,8 +91,7 @@ class BaseCombatTask(CombatCheck):
         raise exception_type(message)
 
     def available(self, name):
-        current = self.calculate_color_percentage(text_white_color,
-                                                  self.get_box_by_name(f'box_{name}'))
+        current = self.hud[name]
         if current > 0 and not self.has_cd(name):
             return True
 
@@ -224,48 +221,7 @@ class BaseCombatTask(CombatCheck):
         return self.has_cd('resonance')
 
     def has_cd(self, box_name):
-        box = self.get_box_by_name(f'box_{box_name}')
-        cropped = box.crop_frame(self.frame)
-        num_labels, stats, labels = get_connected_area_by_color(cropped, dot_color, connectivity=8, gray_range=22)
-        big_area_count = 0
-        has_dot = False
-        number_count = 0
-        invalid_count = 0
-        # dot = None
-        # output_image = cropped.copy()
-        for i in range(1, num_labels):
-            # Check if the connected co  mponent touches the border
-            left, top, width, height, area = stats[i]
-            if area / self.frame.shape[0] / self.frame.shape[
-                1] > 20 / 3840 / 2160:
-                big_area_count += 1
-            if left > 0 and top > 0 and left + width < box.width and top + height < box.height:
-                # self.logger.debug(f"{box_name} Area of connected component {i}: {area} pixels {width}x{height} ")
-                if 16 / 3840 / 2160 <= area / self.frame.shape[0] / self.frame.shape[
-                    1] <= 90 / 3840 / 2160 and abs(width - height) / (
-                        width + height) < 0.3 and top / cropped.shape[0] > 0.6:
-                    # if  top < (
-                    #     box.height / 2) and left > box.width * 0.2 and left + width < box.width * 0.8:
-                    has_dot = True
-                    #     self.logger.debug(f"{box_name} multiple dots return False")
-                    #     return False
-                    # dot = stats[i]
-                elif 25 / 2160 <= height / self.screen_height <= 45 / 2160 and 5 / 2160 <= width / self.screen_height <= 35 / 2160:
-                    number_count += 1
-            else:
-                # self.logger.debug(f"{box_name} has invalid return False")
-                invalid_count += 1
-                return False
-
-            # Draw the connected component with a random color
-            # mask = labels == i
-            # import numpy as np
-            # output_image[mask] = np.random.randint(0, 255, size=3)
-        # if self.debug:
-        #     self.screenshot(f'{self}_{box_name}_has_cd', output_image)
-        has_cd = (has_dot and 2 <= number_count <= 3)
-        # self.logger.debug(f'{box_name} has_cd {has_cd} {invalid_count} {number_count} {has_dot}')
-        return has_cd
+        return self.hud.cooldown(box_name).has_cd
 
     def get_current_char(self, raise_exception=True) -> BaseChar:
         for char in self.chars:
@@ -377,13 +333,11 @@ class BaseCombatTask(CombatCheck):
         target_index = -1
         if char_config:
             target_index = char_config.get('_ring_color_index', target_index)
-        cropped = box.crop_frame(self.frame)
+        min_area = 1500 / 3840 / 2160 * self.screen_width * self.screen_height
         for i in range(len(con_colors)):
             if target_index != -1 and i != target_index:
                 continue
-            color_range = con_colors[i]
-            area, is_full = self.count_rings(cropped, color_range,
-                                             1500 / 3840 / 2160 * self.screen_width * self.screen_height)
+            area, is_full = self.ring_detector.rings(self.frame, box, min_area, i)
             # self.logger.debug(f'is_con_full test color_range {color_range} {area, is_full}')
             if is_full:
                 max_is_full = is_full
@@ -420,76 +374,6 @@ class BaseCombatTask(CombatCheck):
             percent = 1
         return percent
 
-    def count_rings(self, image, color_range, min_area):
-        # Define the color range
-        lower_bound, upper_bound = color_range_to_bound(color_range)
-
-        # image_with_contours = image.copy()
-
-        # Create a binary mask
-        mask = cv2.inRange(image, lower_bound, upper_bound)
-
-        # Find connected components
-        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
-
-        colors = [
-            (0, 255, 0),  # Green
-            (0, 0, 255),  # Red
-            (255, 0, 0),  # Blue
-            (0, 255, 255),  # Yellow
-            (255, 0, 255),  # Magenta
-            (255, 255, 0)  # Cyan
-        ]
-
-        # Function to check if a component forms a ring
-        def is_full_ring(component_mask):
-            # Find contours
-            contours, _ = cv2.findContours(component_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if len(contours) != 1:
-                return False
-            contour = contours[0]
-
-            # Check if the contour is closed by checking if the start and end points are the same
-            # if cv2.arcLength(contour, True) > 0:
-            #     return True
-            # Approximate the contour with polygons.
-            epsilon = 0.05 * cv2.arcLength(contour, True)
-            approx = cv2.approxPolyDP(contour, epsilon, True)
-
-            # Check if the polygon is closed (has no gaps) and has a reasonable number of vertices for a ring.
-            if not cv2.isContourConvex(approx) or len(approx) < 4:
-                return False
-
-            # All conditions met, likely a close ring.
-            return True
-
-        # Iterate over each component
-        ring_count = 0
-        is_full = False
-        the_area = 0
-        for label in range(1, num_labels):
-            x, y, width, height, area = stats[label, :5]
-            bounding_box_area = width * height
-            component_mask = (labels == label).astype(np.uint8) * 255
-            contours, _ = cv2.findContours(component_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            # color = colors[label % len(colors)]
-            # cv2.drawContours(image_with_contours, contours, -1, color, 2)
-            if bounding_box_area >= min_area:
-                # Select a color from the list based on the label index
-                if is_full_ring(component_mask):
-                    is_full = True
-                the_area = area
-                ring_count += 1
-
-        # Save or display the image with contours
-        # cv2.imwrite(f'test\\test_{self}_{is_full}_{the_area}_{lower_bound}.jpg', image_with_contours)
-        if ring_count > 1:
-            is_full = False
-            the_area = 0
-            self.logger.warning(f'is_con_full found multiple rings {ring_count}')
-
-        return the_area, is_full
-
 
 white_color = {
     'r': (253, 255),  # Red range
@@ -5,9 +5,11 @@ from datetime import datetime, timedelta
 import numpy as np
 
 from ok import BaseTask, Logger, find_boxes_by_name, og, Box
-from ok import CannotFindException
+from ok import CannotFindException, color_range_to_bound
 import cv2
 
+from src.EchoTracker import EchoTracker
+from src.RegionChangeDetector import RegionChangeDetector
 
 logger = Logger.get_logger(__name__)
 number_re = re.compile(r'^(\d+)$')
@@ -27,6 +29,15 @@ class BaseWWTask(BaseTask):
         self.monthly_card_config = self.get_global_config('Monthly Card Config')
         self.next_monthly_card_start = 0
         self._logged_in = False
+        self._in_team_frame = None
+        self._in_team_result = None
+        self._in_team_cost = 0
+        self._char_text_signatures = None
+        self._char_text_signatures_shape = None
+        self._char_text_matches = {}
+        self.region_changes = RegionChangeDetector()
+        self._color_tables_frame = None
+        self._color_tables = {}
         self.bosses_pos = {
             'Bell-Borne Geochelone': [0, 0, False],
             'Dreamless': [0, 2, True],
@@ -144,10 +155,18 @@ class BaseWWTask(BaseTask):
     def has_target(self):
         return False
 
+    @property
+    def echo_steer_box(self):
+        return self.box_of_screen(0.25, 0.35, 0.75, 0.95, name='echo_steer_box')
+
     def walk_to_yolo_echo(self, time_out=8, update_function=None, echo_threshold=0.5):
         last_direction = None
         start = time.time()
         no_echo_start = 0
+        steer_box = self.echo_steer_box
+        echo = None
+        # yolo runs every few frames, the tracker follows the echo in between
+        tracker = EchoTracker()
         while time.time() - start < time_out:
             self.next_frame()
             if self.pick_f():
@@ -157,8 +176,24 @@ class BaseWWTask(BaseTask):
             if self.has_target():
                 self.log_debug('pick echo has_target return fail')
                 return False
-            echos = self.find_echos(threshold=echo_threshold)
+            tracked = None
+            if not tracker.need_detection():
+                tracked = tracker.track(self.frame)
+            if tracked is None:
+                # the tracker template is cropped from this frame, so the boxes must be detected on it
+                if echo is not None and steer_box.x <= echo.center()[0] <= steer_box.x + steer_box.width and \
+                        steer_box.y <= echo.y <= steer_box.y + steer_box.height:
+                    # the echo is close and in front, a low res search of the front area is enough to steer
+                    echos = self.detect_echos(threshold=echo_threshold, box=steer_box, input_size=320)
+                else:
+                    echos = self.detect_echos(threshold=echo_threshold)
+                tracked = tracker.update_detection(self.frame, echos)
+            echos = [echo_foot(tracked)] if tracked is not None else []
+            self.draw_boxes("echo", echos)
+            self.info_set('Echo Detections', tracker.detections)
+            self.info_set('Echo Tracked Frames', tracker.tracked_frames)
             if not echos:
+                echo = None
                 if no_echo_start == 0:
                     no_echo_start = time.time()
                 elif time.time() - no_echo_start > 3:
@@ -462,23 +497,29 @@ class BaseWWTask(BaseTask):
         result = self.executor.ocr_lib(image, use_det=True, use_cls=False, use_rec=True)
         self.logger.info(f'ocr_result {result}')
 
-    def find_echos(self, threshold=0.3):
+    def detect_echos(self, threshold=0.3, box=None, input_size=640):
         """
-        Main function to load ONNX model, perform inference, draw bounding boxes, and display the output image.
+        Detect echos in the current frame with the yolo model.
 
         Args:
-            onnx_model (str): Path to the ONNX model.
-            input_image (ndarray): Path to the input image.
+            threshold (float): Minimum confidence of an echo.
+            box (Box): Only search inside this region of the frame.
+            input_size (int): Model input size, use a small size with a small box for cheap close range checks.
 
         Returns:
-            list: List of dictionaries containing detection information such as class_id, class_name, confidence, etc.
+            list: The echo boxes as detected, shared with the detection cache, do not modify them.
         """
-        # Load the ONNX model
-        ret = og.my_app.yolo_detect(self.frame, threshold=threshold, label=0)
+        boxes = og.my_app.yolo_detect(self.frame, threshold=threshold, label=0, box=box, input_size=input_size)
+        self.info_set('Yolo Cache Hit', og.my_app.yolo_cache_hits)
+        self.info_set('Yolo Cache Miss', og.my_app.yolo_cache_misses)
+        return boxes
 
-        for box in ret:
-            box.y += box.height * 1/3
-            box.height = 1
+    def find_echos(self, threshold=0.3, box=None, input_size=640):
+        """
+        Same as detect_echos, but the boxes are moved to the lower part of the echo with a height of 1.
+        """
+        ret = [echo_foot(box) for box in
+               self.detect_echos(threshold=threshold, box=box, input_size=input_size)]
         self.draw_boxes("echo", ret)
         return ret
 
@@ -631,18 +672,66 @@ class BaseWWTask(BaseTask):
                 self.sleep(3)
                 return True
 
+    def calculate_color_percentage(self, color, box):
+        """
+        Same as BaseTask.calculate_color_percentage, with a lazy summed area table per color.
+
+        From the third query of a color on a frame, the mask of that color is built once with its integral image
+        over the area the color was queried on in this and the last frame. Every box inside it is then an O(1)
+        lookup. Colors queried once or twice per frame, or on boxes far apart, never build a table, counting each box
+        is cheaper there.
+        """
+        if isinstance(box, str):
+            box = self.get_box_by_name(box)
+        frame = self.frame
+        if frame is not self._color_tables_frame:
+            self._color_tables_frame = frame
+            for table in self._color_tables.values():
+                table.next_frame()
+        # keyed by value, the same range may come from different dicts and a dict id can be reused once it's freed
+        key = (tuple(color['r']), tuple(color['g']), tuple(color['b']))
+        table = self._color_tables.get(key)
+        if table is None:
+            table = self._color_tables[key] = ColorTable(color)
+        percentage = table.query(frame, box)
+        if percentage is None:
+            percentage = super().calculate_color_percentage(color, box)
+        return percentage
+
     def in_team_and_world(self):
         return self.in_team()[
             0]  # and self.find_one(f'gray_book_button', threshold=0.7, canny_lower=50, canny_higher=150)
 
     def in_team(self):
-        c1 = self.find_one('char_1_text',
-                           threshold=0.75)
-        c2 = self.find_one('char_2_text',
-                           threshold=0.75)
-        c3 = self.find_one('char_3_text',
-                           threshold=0.75)
-        arr = [c1, c2, c3]
+        """
+        Returns:
+            tuple: (in team, index of the current char, char count), memoized for the current frame.
+        """
+        stats = og.my_app
+        stats.in_team_calls += 1
+        frame = self.frame
+        if frame is self._in_team_frame:
+            stats.in_team_memo_hits += 1
+            stats.in_team_time_saved += self._in_team_cost
+            return self._in_team_result
+        start = time.perf_counter()
+        arr = []
+        for i in range(3):
+            name = f'char_{i + 1}_text'
+            area, template_bright = self.char_text_signature(name)
+            if not self.region_changes.changed(name, frame, area) and name in self._char_text_matches:
+                # the char text area looks the same as last time, so does the match
+                stats.in_team_skipped_matches += 1
+                stats.in_team_time_saved += stats.in_team_match_cost
+            elif count_bright(area.crop_frame(frame)) >= template_bright * 0.5:
+                match_start = time.perf_counter()
+                self._char_text_matches[name] = self.find_one(name, threshold=0.75)
+                stats.in_team_match_cost = time.perf_counter() - match_start
+            else:
+                self._char_text_matches[name] = None
+                stats.in_team_skipped_matches += 1
+                stats.in_team_time_saved += stats.in_team_match_cost
+            arr.append(self._char_text_matches[name])
         # logger.debug(f'in_team check {arr} time: {(time.time() - start):.3f}s')
         current = -1
         exist_count = 0
@@ -654,9 +743,41 @@ class BaseWWTask(BaseTask):
                 exist_count += 1
         if exist_count == 2 or exist_count == 1:
             self._logged_in = True
-            return True, current, exist_count + 1
+            result = True, current, exist_count + 1
         else:
-            return False, -1, exist_count + 1
+            result = False, -1, exist_count + 1
+        self._in_team_frame = frame
+        self._in_team_result = result
+        self._in_team_cost = time.perf_counter() - start
+        self.info_set('In Team Calls', stats.in_team_calls)
+        self.info_set('In Team Memo Hits', stats.in_team_memo_hits)
+        self.info_set('In Team Skipped Matches', stats.in_team_skipped_matches)
+        self.info_set('In Team Time Saved', f'{stats.in_team_time_saved:.2f}s')
+        for name, rate in self.region_changes.change_rates().items():
+            self.info_set(f'{name} Change Rate', f'{rate:.0%}')
+        return result
+
+    def char_text_signature(self, name):
+        """
+        The search area of a char_x_text template and its bright pixel count, for a cheap pre-check before matching.
+        The template is a white badge, if the area has less than half of the template's bright pixels the match
+        can't succeed.
+        """
+        if self._char_text_signatures_shape != self.frame.shape[:2]:
+            self._char_text_signatures = {}
+            self._char_text_signatures_shape = self.frame.shape[:2]
+            self._char_text_matches = {}
+        signature = self._char_text_signatures.get(name)
+        if signature is None:
+            box = self.get_box_by_name(name)
+            # the default template matching variance plus a pixel of rounding
+            margin_x = int(self.width_of_screen(0.002)) + 1
+            margin_y = int(self.height_of_screen(0.002)) + 1
+            area = box.copy(x_offset=-margin_x, y_offset=-margin_y, width_offset=margin_x * 2,
+                            height_offset=margin_y * 2, name=f'{name}_area')
+            signature = area, count_bright(self.get_feature_by_name(name).mat)
+            self._char_text_signatures[name] = signature
+        return signature
 
         # Function to check if a component forms a ring
 
@@ -786,3 +907,88 @@ echo_color = {
     'g': (150, 220),  # Green range
     'b': (130, 170)  # Blue range
 }
+
+
+def echo_foot(box):
+    # the lower part of the echo, where the character has to stand to pick it
+    return box.copy(y_offset=box.height * 1 / 3, height_offset=1 - box.height)
+
+
+def count_bright(image):
+    if image.ndim == 2:
+        return cv2.countNonZero(cv2.inRange(image, 160, 255))
+    return cv2.countNonZero(cv2.inRange(image, (160, 160, 160), (255, 255, 255)))
+
+
+class ColorTable:
+    """
+    Summed area table of one color's mask over part of a frame, built on the min_queries-th query of the frame.
+    Building it costs about as much as counting the color in as many pixels directly, so it's only built if the boxes
+    left to query, guessed from the last frame, cover more pixels than the table.
+    """
+
+    def __init__(self, color, min_queries=3):
+        self.color = color
+        self.min_queries = min_queries
+        self.queries = 0
+        self.queried_area = 0
+        self.last_queried_area = 0
+        self.area = None
+        self.last_area = None
+        self.origin = None
+        self.integral = None
+
+    def next_frame(self):
+        self.last_area = self.area
+        self.area = None
+        self.queries = 0
+        self.last_queried_area = self.queried_area
+        self.queried_area = 0
+        self.integral = None
+
+    def query(self, frame, box):
+        """
+        Returns:
+            float: the color percentage of box, None if it's not covered by a table.
+        """
+        frame_h, frame_w = frame.shape[:2]
+        x, y = max(0, int(box.x)), max(0, int(box.y))
+        to_x, to_y = min(frame_w, int(box.x) + int(box.width)), min(frame_h, int(box.y) + int(box.height))
+        if to_x <= x or to_y <= y:
+            return None
+        self.queries += 1
+        box_area = (to_x - x) * (to_y - y)
+        self.queried_area += box_area
+        self.area = union_rect(self.area, (x, y, to_x, to_y))
+        if self.integral is None:
+            if self.queries < self.min_queries:
+                return None
+            rect = union_rect(self.area, self.last_area)
+            left_area = self.last_queried_area - self.queried_area + box_area
+            if left_area <= (rect[2] - rect[0]) * (rect[3] - rect[1]):
+                return None
+            self.build(frame, rect)
+        ox, oy = self.origin
+        table_h, table_w = self.integral.shape[0] - 1, self.integral.shape[1] - 1
+        if x < ox or y < oy or to_x > ox + table_w or to_y > oy + table_h:
+            return None
+        s = self.integral
+        x0, y0, x1, y1 = x - ox, y - oy, to_x - ox, to_y - oy
+        count = int(s[y1, x1]) - int(s[y0, x1]) - int(s[y1, x0]) + int(s[y0, x0])
+        return count / 255 / ((to_x - x) * (to_y - y))
+
+    def build(self, frame, rect):
+        x, y, to_x, to_y = rect
+        mask = cv2.inRange(frame[y:to_y, x:to_x], *color_range_to_bound(self.color))
+        # the mask is 0 or 255, 32 bit sums hold up to 8M pixels
+        depth = cv2.CV_32S if mask.size < 8_000_000 else cv2.CV_64F
+        self.integral = cv2.integral(mask, sdepth=depth)
+        self.origin = (x, y)
+
+
+def union_rect(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
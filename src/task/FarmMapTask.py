@@ -8,6 +8,12 @@ import numpy as np
 from qfluentwidgets import FluentIcon
 
 from ok import Logger, Box, get_bounding_box
+from src.map.ArrowTemplateBank import ArrowTemplateBank
+from src.map.HeadingEstimator import HeadingEstimator
+from src.map.KeypointLocalizer import KeypointLocalizer
+from src.map.MapLocalizer import MapLocalizer
+from src.map.MotionModel import MotionModel
+from src.map.RoutePlanner import nearest_neighbour_route, route_length, improve_route
 from src.task.BaseCombatTask import BaseCombatTask
 from src.task.WWOneTimeTask import WWOneTimeTask
 
@@ -20,6 +26,13 @@ class BigMap(WWOneTimeTask, BaseCombatTask):
         self.stars = None
         self.my_box = None
         self.diamond = None
+        self.arrow_bank = None
+        self.heading = None
+        self.localizer = None
+        self.keypoints = None
+        self.motion = MotionModel()
+        # seconds between two big map localizations while the position can be dead reckoned, 0 for every time
+        self.localization_interval = 0
 
 
     def reset(self):
@@ -27,6 +40,11 @@ class BigMap(WWOneTimeTask, BaseCombatTask):
         self.stars = None
         self.my_box = None
         self.diamond = None
+        self.localizer = None
+        self.keypoints = None
+        self.motion.reset()
+        if self.heading is not None:
+            self.heading.reset()
 
     def load_stars(self, wait_world=True):
         self.reset()
@@ -37,9 +55,12 @@ class BigMap(WWOneTimeTask, BaseCombatTask):
             raise Exception('Need be in the map screen and have a diamond as the starting point!')
         self.stars = self.find_feature('big_map_star', threshold=0.7, frame=self.big_map_frame, box=Box(0,0,self.big_map_frame.shape[1],self.big_map_frame.shape[0]))
         all_star_len = len(self.stars)
-        self.stars = sort_stars(self.stars, self.diamond, self.height_of_screen(0.2))
+        self.stars = self.plan_route(self.stars)
         self.stars.insert(0, self.diamond)
         mini_map_box = self.get_box_by_name('box_minimap')
+        self.localizer = MapLocalizer(self.big_map_frame,
+                                      create_circle_mask_with_hole(mini_map_box.crop_frame(self.big_map_frame)))
+        self.keypoints = KeypointLocalizer(self.big_map_frame)
         self.my_box = self.diamond.scale(mini_map_box.width/self.diamond.width * 2)
         # if self.debug:
         #     init_my_box = self.my_box.crop_frame(self.frame)
@@ -56,6 +77,16 @@ class BigMap(WWOneTimeTask, BaseCombatTask):
         if wait_world:
             self.wait_in_team_and_world()
 
+    def plan_route(self, stars):
+        max_distance = self.height_of_screen(0.2)
+        route = nearest_neighbour_route(stars, self.diamond, max_distance)
+        before = route_length(self.diamond, route)
+        route = improve_route(self.diamond, route, max_distance)
+        after = route_length(self.diamond, route)
+        self.log_info(f'route length {before:.0f} -> {after:.0f}')
+        self.info_set('Route Length', f'{before:.0f} -> {after:.0f}')
+        return route
+
     def get_angle_between(self, my_angle, angle):
         if my_angle > angle:
             to_turn = angle - my_angle
@@ -68,42 +99,35 @@ class BigMap(WWOneTimeTask, BaseCombatTask):
         return to_turn
 
     def get_my_angle(self):
-        return self.rotate_arrow_and_find()[0]
+        self.get_arrow_bank()
+        angle, confidence = self.heading.estimate(self.arrow_search_box().crop_frame(self.frame))
+        return angle if angle is not None else 0
 
-    def rotate_arrow_and_find(self):
+    def get_arrow_bank(self):
         arrow_template = self.get_feature_by_name('arrow')
-        original_mat = arrow_template.mat
-        max_conf = 0
-        max_angle = 0
-        max_target = None
-        max_mat = None
-        (h, w) = arrow_template.mat.shape[:2]
-        # self.log_debug(f'turn_east h:{h} w:{w}')
-        center = (w // 2, h // 2)
+        if self.arrow_bank is None or self.arrow_bank.shape != arrow_template.mat.shape:
+            self.arrow_bank = ArrowTemplateBank(arrow_template.mat)
+            self.heading = HeadingEstimator(self.arrow_bank)
+        return self.arrow_bank
+
+    def rotate_arrow_and_find(self):
+        self.get_arrow_bank()
+        target_box = self.arrow_search_box()
+        angle, confidence, (x, y) = self.arrow_bank.match(target_box.crop_frame(self.frame))
+        if confidence <= 0.01:
+            return 0, None
+        max_target = Box(target_box.x + x, target_box.y + y, self.arrow_bank.width, self.arrow_bank.height,
+                         confidence=confidence, name='arrow')
+        return int(angle), max_target
+
+    def arrow_search_box(self):
         target_box = self.get_box_by_name('arrow')
-        # if self.debug:
-        #     self.screenshot('arrow_original', original_ mat)
-        for angle in range(0, 360):
-            # Rotate the template image
-            rotation_matrix = cv2.getRotationMatrix2D(center, -angle, 1.0)
-            template = cv2.warpAffine(original_mat, rotation_matrix, (w, h))
-            # mask = np.where(np.all(template == [0, 0, 0], axis=2), 0, 255).astype(np.uint8)
-
-            target = self.find_one(box=target_box,
-                                   template=template, threshold=0.01)
-            # if self.debug and angle % 90 == 0:
-            #     self.screenshot(f'arrow_rotated_{angle}', arrow_template.mat)
-            if target and target.confidence > max_conf:
-                max_conf = target.confidence
-                max_angle = angle
-                max_target = target
-                # max_mat = template
-        # arrow_template.mat = original_mat
-        # arrow_template.mask = None
-        # if self.debug and max_mat is not None:
-        #     self.screenshot('max_mat',frame=max_mat)
-        # self.log_debug(f'turn_east max_conf: {max_conf} {max_angle}')
-        return max_angle, max_target
+        # the search area must hold the whole template
+        x_offset = min(target_box.width - self.arrow_bank.width, 0) // 2
+        y_offset = min(target_box.height - self.arrow_bank.height, 0) // 2
+        return target_box.copy(x_offset=x_offset, y_offset=y_offset,
+                               width_offset=max(self.arrow_bank.width - target_box.width, 0),
+                               height_offset=max(self.arrow_bank.height - target_box.height, 0))
 
     def find_closest(self, my_box):
         min_distance = 100000
@@ -117,20 +141,39 @@ class BigMap(WWOneTimeTask, BaseCombatTask):
                 min_star = star
         return min_star
 
+    @property
+    def star_move_distance_threshold(self):
+        return self.height_of_screen(0.03)
+
     def find_direction_angle(self, screenshot=False):
         if len(self.stars) == 0:
             return None, 0, 0
-        my_box = self.find_my_location(screenshot=screenshot)
-        sort_stars(self.stars, my_box,0)
+        now = time.time()
+        my_angle = self.get_my_angle()
+        self.motion.set_heading(my_angle if self.heading.reliable else None, now)
         min_star = self.stars[0]
+        if screenshot or self.motion.needs_fix(now, self.localization_interval, self.star_move_distance_threshold):
+            my_box = self.find_moved_location(now, screenshot=screenshot)
+        else:
+            my_box = self.motion.predict(now)
+            self.info_set('Predicted Locations', self.motion.predictions)
+            # reaching a star is only decided on a real location
+            if my_box.center_distance(min_star) <= self.star_move_distance_threshold * 2 + self.motion.uncertainty:
+                my_box = self.find_moved_location(now)
         min_distance = my_box.center_distance(min_star)
         self.draw_boxes('star', min_star, color='green')
         direction_angle = calculate_angle_clockwise(my_box, min_star)
-        my_angle = self.get_my_angle()
         to_turn = self.get_angle_between(my_angle, direction_angle)
         # self.log_debug(f'direction_angle {to_turn} {my_angle} {direction_angle}  min_distance {min_distance} min_star {min_star} ')
         return min_star, min_distance, to_turn
 
+    def find_moved_location(self, now, screenshot=False):
+        # search around where the motion model expects the character, it may have left my_box since the last fix
+        search_box = self.motion.search_box(now, 1.3)
+        if search_box is not None:
+            self.my_box = search_box
+        return self.find_my_location(screenshot=screenshot)
+
     def remove_star(self, star):
         before = len(self.stars)
         self.stars.remove(star)
@@ -143,10 +186,13 @@ class BigMap(WWOneTimeTask, BaseCombatTask):
         # mask = create_circle_mask_with_hole(mat)
         # mat = cv2.bitwise_and(mat, mat, mask=mask)
 
-        in_big_map = self.find_one(frame=frame, template=mat, threshold=0.05,
-                                   box=self.my_box, mask_function=create_circle_mask_with_hole,
-                                   screenshot=screenshot)
+        in_big_map = self.localizer.locate(mat, box=self.my_box, threshold=0.05)
         # in_big_maps = self.find_feature(frame=frame, template=mat, threshold=0.01, box=self.bounding_box)
+        if in_big_map:
+            self.motion.fix(in_big_map, time.time())
+        else:
+            # fixes the motion model itself
+            in_big_map = self.recover_location(mat)
         if not in_big_map:
             raise RuntimeError('can not find my cords on big map!')
         self.log_debug(f'found in_big_map: {in_big_map}')
@@ -157,9 +203,29 @@ class BigMap(WWOneTimeTask, BaseCombatTask):
             self.draw_boxes('me', in_big_map.scale(0.1), color='blue')
             # self.screenshot('box_minimap', frame=frame, show_box=True)
             # self.screenshot('template_minimap', frame=mat)
+        if screenshot:
+            self.screenshot('in_big_map', frame=frame, show_box=True)
         self.my_box = in_big_map.scale(1.3)
         return in_big_map
 
+    def recover_location(self, mat=None):
+        """
+        Find the minimap anywhere on the big map with the keypoint index, when it is no longer near my_box after a
+        teleport or being knocked around in combat, then refine it with the template match.
+        """
+        if mat is None:
+            mat = self.get_box_by_name('box_minimap').crop_frame(self.frame)
+        found = self.keypoints.locate(mat, self.localizer.mask)
+        if not found:
+            self.log_debug('recover_location can not find keypoint matches')
+            return None
+        in_big_map = self.localizer.locate(mat, box=found.scale(1.3), threshold=0.05)
+        self.log_info(f'recovered location {found} -> {in_big_map}')
+        if in_big_map:
+            self.my_box = in_big_map.scale(1.3)
+            self.motion.fix(in_big_map, time.time(), jumped=True)
+        return in_big_map
+
 def create_circle_mask_with_hole(image):
     """
     Creates a binary circular mask with a rectangular hole in the center.
@@ -202,14 +268,17 @@ class FarmMapTask(BigMap):
         self.stuck_index = 0
         self.last_distance = 0
         self._has_health_bar = False
-
-    @property
-    def star_move_distance_threshold(self):
-        return self.height_of_screen(0.03)
+        self.default_config.update({
+            'Localization Interval': 1.0,
+        })
+        self.config_description.update({
+            'Localization Interval': 'Seconds between two big map localizations while running straight, the position in between is estimated from the heading and speed, 0 to localize every time',
+        })
 
     def run(self):
         self.stuck_index = 0
         self.last_distance = 0
+        self.localization_interval = self.config.get('Localization Interval', 1.0)
         self.load_stars()
         self.go_to_star()
 
@@ -234,6 +303,7 @@ class FarmMapTask(BigMap):
                 if current_direction is not None:
                     self.mouse_up(key='right')
                     self.send_key_up(current_direction)
+                    self.motion.set_running(False, time.time())
                     current_direction = None
                 start = time.time()
                 self.combat_once()
@@ -263,14 +333,21 @@ class FarmMapTask(BigMap):
                     self.log_error('too far from next star, stop farming', notify=True)
                     break
                 else:
+                    # maybe my_box lost track of the character
+                    self.recover_location()
                     continue
-            elif distance == self.last_distance:
+            elif not self.motion.predicted and distance == self.last_distance:
                 logger.info(f'might be stuck, try {[self.stuck_index % 4]}')
                 self.send_key(self.stuck_keys[self.stuck_index % 4][0], down_time=self.stuck_keys[self.stuck_index % 4][1], after_sleep=0.5)
                 self.stuck_index += 1
                 continue
 
-            self.last_distance = distance
+            if not self.motion.predicted:
+                self.last_distance = distance
+
+            if current_direction is not None and not self.heading.reliable:
+                self.log_debug(f'heading confidence too low {self.heading.confidence:.2f}, keep running')
+                continue
 
             if current_direction == 'w':
                 if 10 <= angle <= 80:
@@ -304,17 +381,20 @@ class FarmMapTask(BigMap):
                 if current_direction:
                     self.mouse_up(key='right')
                     self.send_key_up(current_direction)
+                    self.motion.set_running(False, time.time())
                     self.sleep(0.2)
                 self.turn_direction(new_direction)
                 self.send_key_down('w')
                 self.sleep(0.2)
                 self.mouse_down(key='right')
+                self.motion.set_running(True, time.time())
                 current_direction = 'w'
                 self.sleep(1)
 
         if current_direction is not None:
             self.mouse_up(key='right')
             self.send_key_up(current_direction)
+            self.motion.set_running(False, time.time())
 
 def calculate_angle_clockwise(box1, box2):
   """
@@ -340,36 +420,6 @@ star_color = {
 }
 
 
-def sort_stars(points, start_point, max_distance = 0):
-    """
-    BUILDS A PATH using Nearest Neighbor heuristic starting from 'start_point'.
-    Filters steps where distance < 'min_distance'. Prepends start_point.
-    NOTE: This is a HEURISTIC, likely NOT the absolute shortest total path.
-    """
-    unvisited = points[:]  # Copy the list of points to visit
-    if not unvisited:  # Handle empty input list
-        return []
-
-    path_result = []  # Initialize empty list for the results (excluding start)
-    current_point = start_point  # Start the calculation from start_point
-    while unvisited:
-        # Find points reachable according to min_distance
-        # If min_distance is 0, distance(..) >= 0 is always true for distinct points.
-        reachable_points = [p for p in unvisited if max_distance == 0 or current_point.center_distance(p) <= max_distance]
-        if not reachable_points:
-            # Stop if no remaining points meet the criteria (or if unvisited is empty)
-            # print(f"Stopping: No remaining points meet criteria from {current_point}.") # Optional debug
-            break
-            # Find the closest point among the reachable ones
-        next_point = min(reachable_points, key=lambda p: current_point.center_distance(p))
-
-        path_result.append(next_point)  # Add the chosen point to the result list
-        unvisited.remove(next_point)  # Mark as visited
-        current_point = next_point  # Update the current point for the next iteration
-    return path_result
-
-
-
 def mask_star(image):
     # return image
     return create_color_mask(image, star_color)
@@ -0,0 +1,154 @@
+import os
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+from ok import Logger
+from src.map.ArrowTemplateBank import ArrowTemplateBank
+from src.map.HeadingEstimator import HeadingEstimator
+
+logger = Logger.get_logger(__name__)
+
+size = 56
+# the arrow template and the arrow search box at 4K
+size_4k = 113
+area_4k = (171, 178)
+
+
+def draw_arrow(background, angle):
+    image = background.copy()
+    size = image.shape[0]
+    center = size // 2
+    k = size / 56
+    points = np.array([[center, center - 20 * k], [center + 12 * k, center + 14 * k], [center, center + 6 * k],
+                       [center - 12 * k, center + 14 * k]], np.float32)
+    rotation_matrix = cv2.getRotationMatrix2D((center, center), -angle, 1.0)
+    points = cv2.transform(points[None], rotation_matrix)[0].astype(np.int32)
+    cv2.fillPoly(image, [points], (40, 220, 250))
+    return image
+
+
+def loop_match(area, template, angles=range(360), mask=None):
+    # the 360 warps and matches of rotate_arrow_and_find before ArrowTemplateBank, with the rotation masks unless a
+    # mask is given
+    size = template.shape[0]
+    full = np.full(template.shape[:2], 255, dtype=np.uint8)
+    results = []
+    for angle in angles:
+        rotation_matrix = cv2.getRotationMatrix2D((size // 2, size // 2), -angle, 1.0)
+        rotated = cv2.warpAffine(template, rotation_matrix, (size, size))
+        if mask is None:
+            rotated_mask = cv2.warpAffine(full, rotation_matrix, (size, size), flags=cv2.INTER_NEAREST)
+        else:
+            rotated_mask = mask
+        result = cv2.matchTemplate(area, rotated, cv2.TM_CCOEFF_NORMED, mask=rotated_mask)
+        results.append(np.nan_to_num(result, nan=0, posinf=0, neginf=0))
+    return np.array(results)
+
+
+def background(rng, shape):
+    return cv2.GaussianBlur(rng.integers(40, 120, shape + (3,), dtype=np.uint8), (0, 0), shape[0] / 40)
+
+
+class TestArrowTemplateBank(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.rng = np.random.default_rng(0)
+        cls.backgrounds = [cv2.GaussianBlur(cls.rng.integers(40, 120, (size, size, 3), dtype=np.uint8), (7, 7), 0)
+                           for _ in range(5)]
+        cls.template = draw_arrow(cls.backgrounds[0], 0)
+        cls.bank = ArrowTemplateBank(cls.template)
+
+    def area(self, angle, index):
+        return np.pad(draw_arrow(self.backgrounds[index], angle), ((6, 6), (6, 6), (0, 0)), mode='edge')
+
+    def area_4k(self, angle, x=30, y=28):
+        area = background(self.rng, area_4k)
+        area[y:y + size_4k, x:x + size_4k] = draw_arrow(background(self.rng, (size_4k, size_4k)), angle)
+        return area
+
+    def test_same_as_matching_each_rotation(self):
+        bank = ArrowTemplateBank(self.template, max_size=size)
+        for index, angle in enumerate([37, 130, 271, 359]):
+            area = self.area(angle, index + 1)
+            expected = loop_match(area, self.template, mask=bank.mask)
+            np.testing.assert_allclose(bank.scores(area), expected, atol=1e-4)
+            found, confidence, location = bank.match(area)
+            self.assertLessEqual(abs(found - angle), 2)
+            self.assertGreater(confidence, 0.9)
+
+    def test_downscaled_4k(self):
+        template = draw_arrow(background(self.rng, (size_4k, size_4k)), 0)
+        bank = ArrowTemplateBank(template)
+        for angle in [37, 130, 200.5, 271, 359]:
+            found, confidence, (x, y) = bank.match(self.area_4k(angle))
+            self.assertLessEqual(abs((found - angle + 180) % 360 - 180), 2)
+            self.assertGreater(confidence, 0.8)
+            # one pixel of the downscaled area is 1 / bank.scale pixels of the frame
+            self.assertLessEqual(max(abs(x - 30), abs(y - 28)), 2 / bank.scale)
+
+    def test_heading_estimator(self):
+        heading = HeadingEstimator(self.bank)
+        for angle in [100, 104, 109, 200, 205, 1, 358]:
+            found, confidence = heading.estimate(self.area(angle, 1))
+            self.assertLessEqual(abs((found - angle + 180) % 360 - 180), 2)
+            self.assertTrue(heading.reliable)
+        # the small turns are searched around the last heading, the jumps widen to the whole circle
+        self.assertEqual(heading.full_count, 3)
+        self.assertEqual(heading.narrow_count, 4)
+
+    @unittest.skipUnless(os.environ.get('BENCHMARK'), 'timing only, set BENCHMARK=1 to run it')
+    def test_benchmark(self):
+        area = self.area(130, 1)
+        start = time.perf_counter()
+        loop_match(area, self.template)
+        loop_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(5):
+            self.bank.match(area)
+        bank_time = (time.perf_counter() - start) / 5
+        logger.info(f'rotations loop {loop_time * 1000:.1f}ms bank {bank_time * 1000:.1f}ms')
+
+    @unittest.skipUnless(os.environ.get('BENCHMARK'), 'timing only, set BENCHMARK=1 to run it')
+    def test_benchmark_4k(self):
+        template = draw_arrow(background(self.rng, (size_4k, size_4k)), 0)
+        area = self.area_4k(130)
+        start = time.perf_counter()
+        # every 10th rotation of the loop, times 10
+        loop_match(area, template, angles=range(0, 360, 10))
+        loop_time = (time.perf_counter() - start) * 10
+        start = time.perf_counter()
+        bank = ArrowTemplateBank(template)
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(5):
+            bank.match(area)
+        bank_time = (time.perf_counter() - start) / 5
+        logger.info(f'4k rotations loop {loop_time * 1000:.1f}ms bank {bank_time * 1000:.1f}ms '
+                    f'build {build_time * 1000:.1f}ms')
+
+    @unittest.skipUnless(os.environ.get('BENCHMARK'), 'timing only, set BENCHMARK=1 to run it')
+    def test_heading_benchmark_4k(self):
+        template = draw_arrow(background(self.rng, (size_4k, size_4k)), 0)
+        heading = HeadingEstimator(ArrowTemplateBank(template))
+        areas = [self.area_4k(angle) for angle in (130, 134, 139, 135, 128)]
+        start = time.perf_counter()
+        loop_match(areas[0], template, angles=range(0, 360, 10))
+        loop_time = (time.perf_counter() - start) * 10
+        start = time.perf_counter()
+        heading.estimate(areas[0])
+        full_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for area in areas[1:]:
+            heading.estimate(area)
+        window_time = (time.perf_counter() - start) / (len(areas) - 1)
+        self.assertEqual((heading.full_count, heading.narrow_count), (1, len(areas) - 1))
+        logger.info(f'4k heading loop {loop_time * 1000:.1f}ms full {full_time * 1000:.1f}ms '
+                    f'window {window_time * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from src.combat.CombatCheck import boss_text_mask, match_text_mask, boss_white_text_color, boss_orange_text_color, \
+    boss_red_text_color
+
+text_colors = [('white', boss_white_text_color), ('orange', boss_orange_text_color), ('red', boss_red_text_color)]
+
+
+def bgr(color):
+    return tuple(int(sum(color[c]) / 2) for c in 'bgr')
+
+
+class TestBossLvTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def frame(self, text, color, offset=(0, 0)):
+        # the dark blurred scene behind the boss name
+        frame = cv2.GaussianBlur(self.rng.integers(0, 120, (80, 240, 3), dtype=np.uint8), (0, 0), 2)
+        if text:
+            cv2.putText(frame, text, (40 + offset[0], 50 + offset[1]), cv2.FONT_HERSHEY_SIMPLEX, 0.8, bgr(color), 2)
+        return frame
+
+    def text_box(self):
+        (width, height), baseline = cv2.getTextSize('Lv.90', cv2.FONT_HERSHEY_SIMPLEX, 0.8, 2)
+        return 38, 50 - height - 2, width + 4, height + baseline + 4
+
+    def match(self, frame, mask, color):
+        x, y, width, height = self.text_box()
+        margin_x, margin_y = max(int(width * 0.2), 4), max(int(height * 0.5), 4)
+        area = frame[y - margin_y:y + height + margin_y, x - margin_x:x + width + margin_x]
+        return match_text_mask(area, mask, color)
+
+    def test_match_each_text_color(self):
+        for name, color in text_colors:
+            x, y, width, height = self.text_box()
+            mask, found_color = boss_text_mask(self.frame('Lv.90', color)[y:y + height, x:x + width])
+            self.assertIs(found_color, color, name)
+            self.assertGreaterEqual(self.match(self.frame('Lv.90', color, offset=(2, -1)), mask, color), 0.8, name)
+            self.assertLess(self.match(self.frame('Lv.45', color), mask, color), 0.8, name)
+            self.assertLess(self.match(self.frame(None, color), mask, color), 0.8, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
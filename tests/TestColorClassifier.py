@@ -0,0 +1,61 @@
+import os
+import time
+import unittest
+
+import cv2
+
+from ok import Logger, color_range_to_bound
+from src import text_white_color
+from src.ColorClassifier import ColorClassifier
+from src.char.BaseChar import forte_white_color, dot_color
+from src.combat.CombatCheck import aim_color, enemy_health_color_red, enemy_health_color_black, \
+    boss_white_text_color, boss_orange_text_color, boss_red_text_color, boss_health_color
+from src.task.BaseCombatTask import white_color, con_colors
+from src.task.BaseWWTask import f_white_color, echo_color
+
+logger = Logger.get_logger(__name__)
+
+ui_colors = [text_white_color, forte_white_color, dot_color, aim_color, enemy_health_color_red,
+             enemy_health_color_black, boss_white_text_color, boss_orange_text_color, boss_red_text_color,
+             boss_health_color, white_color, f_white_color, echo_color] + con_colors
+
+
+class TestColorClassifier(unittest.TestCase):
+
+    def setUp(self):
+        self.images = [cv2.imread(f'tests/images/{name}.png') for name in ('in_combat', 'in_combat2', 'in_combat3')]
+
+    def test_same_as_in_range(self):
+        classifier = ColorClassifier(ui_colors)
+        for image in self.images:
+            planes = classifier.classify(image)
+            for color in ui_colors:
+                expected = cv2.inRange(image, *color_range_to_bound(color))
+                self.assertTrue((expected == classifier.mask(planes, color)).all(), color)
+
+    @unittest.skipUnless(os.environ.get('BENCHMARK'), 'timing only, set BENCHMARK=1 to run it')
+    def test_benchmark(self):
+        runs = 10
+        for count in (6, len(ui_colors)):
+            colors = ui_colors[:count]
+            classifier = ColorClassifier(colors)
+            start = time.perf_counter()
+            for _ in range(runs):
+                for image in self.images:
+                    for color in colors:
+                        cv2.countNonZero(cv2.inRange(image, *color_range_to_bound(color)))
+            in_range_time = (time.perf_counter() - start) / runs / len(self.images)
+            start = time.perf_counter()
+            for _ in range(runs):
+                for image in self.images:
+                    planes = classifier.classify(image)
+                    for color in colors:
+                        classifier.count(planes, color)
+            classifier_time = (time.perf_counter() - start) / runs / len(self.images)
+            logger.info(f'{count} color ranges per frame inRange: {in_range_time * 1000:.2f} ms, '
+                        f'ColorClassifier: {classifier_time * 1000:.2f} ms, '
+                        f'speedup: {in_range_time / classifier_time:.1f}x')
+
+
+if __name__ == '__main__':
+    unittest.main()
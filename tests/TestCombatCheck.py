@@ -29,6 +29,12 @@ class TestCombatCheck(TaskTestCase):
         self.assertTrue(in_combat)
         self.logger.debug('in_combat_check task done')
 
+    def test_hud_state(self):
+        for image in ('tests/images/in_combat.png', 'tests/images/in_combat2.png', 'tests/images/in_combat3.png'):
+            self.set_image(image)
+            for name, (color, box) in self.task.hud_queries().items():
+                self.assertAlmostEqual(self.task.calculate_color_percentage(color, box), self.task.hud[name])
+
 
 if __name__ == '__main__':
     unittest.main()
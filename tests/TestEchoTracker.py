@@ -0,0 +1,31 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from ok import Box
+from src.EchoTracker import EchoTracker
+
+
+class TestEchoTracker(unittest.TestCase):
+
+    def frame(self, x, y):
+        rng = np.random.default_rng(0)
+        frame = cv2.GaussianBlur(rng.integers(0, 120, (360, 640, 3), dtype=np.uint8), (0, 0), 3)
+        cv2.circle(frame, (x + 20, y + 20), 14, (60, 200, 240), -1)
+        cv2.circle(frame, (x + 14, y + 14), 5, (250, 250, 250), -1)
+        return frame
+
+    def test_low_score_detection_is_tracked(self):
+        tracker = EchoTracker()
+        # walk_to_yolo_echo accepts echoes from 0.5, below the template match threshold
+        box = tracker.update_detection(self.frame(300, 150), [Box(300, 150, 40, 40, confidence=0.55, name='echo')])
+        self.assertEqual(box.confidence, 0.55)
+        self.assertFalse(tracker.need_detection())
+        tracked = tracker.track(self.frame(304, 152))
+        self.assertEqual((tracked.x, tracked.y), (304, 152))
+        self.assertFalse(tracker.need_detection())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from ok import Box
+from src.map.KeypointLocalizer import KeypointLocalizer
+from src.map.MapLocalizer import MapLocalizer
+from src.task.FarmMapTask import create_circle_mask_with_hole
+
+size = 186
+
+
+class TestMapLocalizer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # a big map like texture of blurred noise crossed by roads
+        cls.rng = np.random.default_rng(0)
+        big_map = cv2.GaussianBlur(cls.rng.integers(0, 255, (1080, 1920, 3), dtype=np.uint8), (0, 0), 6)
+        cls.big_map = cv2.normalize(big_map, None, 0, 255, cv2.NORM_MINMAX)
+        for x1, y1, x2, y2 in cls.rng.integers(0, 1080, (300, 4)):
+            color = tuple(int(c) for c in cls.rng.integers(0, 255, 3))
+            cv2.line(cls.big_map, (int(x1) * 16 // 9, int(y1)), (int(x2) * 16 // 9, int(y2)), color, 2)
+        cls.localizer = MapLocalizer(cls.big_map, create_circle_mask_with_hole(np.empty((size, size))))
+
+    def minimap(self, x, y):
+        noise = self.rng.integers(0, 20, (size, size, 3), dtype=np.uint8)
+        return cv2.add(self.big_map[y:y + size, x:x + size], noise)
+
+    def test_locate_in_box(self):
+        for _ in range(10):
+            x, y = int(self.rng.integers(200, 1500)), int(self.rng.integers(200, 700))
+            box = Box(x - size // 2 + int(self.rng.integers(-40, 40)), y - size // 2 + int(self.rng.integers(-40, 40)),
+                      size * 2, size * 2)
+            found = self.localizer.locate(self.minimap(x, y), box=box)
+            self.assertEqual((found.x, found.y), (x, y))
+
+    def test_locate_whole_map(self):
+        x, y = 1234, 567
+        found = self.localizer.locate(self.minimap(x, y))
+        self.assertEqual((found.x, found.y), (x, y))
+        self.assertGreater(found.confidence, 0.8)
+
+    def test_keypoint_locate(self):
+        keypoints = KeypointLocalizer(self.big_map)
+        found_count = 0
+        for _ in range(10):
+            x, y = int(self.rng.integers(0, 1700)), int(self.rng.integers(0, 890))
+            found = keypoints.locate(self.minimap(x, y), self.localizer.mask)
+            if found:
+                self.assertLessEqual(max(abs(found.x - x), abs(found.y - y)), 3)
+                found_count += 1
+        self.assertGreaterEqual(found_count, 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
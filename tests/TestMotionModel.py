@@ -0,0 +1,33 @@
+import unittest
+
+from ok import Box
+from src.map.MotionModel import MotionModel
+
+
+class TestMotionModel(unittest.TestCase):
+
+    def running(self):
+        motion = MotionModel(smoothing=1)
+        motion.set_running(True, 0)
+        motion.set_heading(0, 0)
+        motion.fix(Box(0, 0, 20, 20), 0)
+        motion.fix(Box(100, 0, 20, 20), 1)
+        return motion
+
+    def test_speed_from_straight_run(self):
+        motion = self.running()
+        self.assertEqual(motion.speed, 100)
+        box = motion.predict(1.5)
+        self.assertEqual((box.x, box.y), (150, 0))
+
+    def test_jump_keeps_speed(self):
+        motion = self.running()
+        # a teleport far away, then the same place found again right after
+        motion.fix(Box(2000, 500, 20, 20), 2, jumped=True)
+        self.assertEqual(motion.speed, 100)
+        motion.fix(Box(2100, 500, 20, 20), 3)
+        self.assertEqual(motion.speed, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
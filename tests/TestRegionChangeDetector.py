@@ -0,0 +1,48 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from ok import Box
+from src.RegionChangeDetector import RegionChangeDetector
+
+
+class TestRegionChangeDetector(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.frame = cv2.GaussianBlur(rng.integers(0, 120, (200, 300, 3), dtype=np.uint8), (0, 0), 2)
+        self.box = Box(50, 40, 180, 100)
+
+    def changed_after(self, draw):
+        detector = RegionChangeDetector()
+        detector.changed('text', self.frame, self.box)
+        frame = self.frame.copy()
+        draw(frame)
+        return detector.changed('text', frame, self.box)
+
+    def test_unchanged(self):
+        self.assertFalse(self.changed_after(lambda frame: None))
+
+    def test_capture_noise_ignored(self):
+        noise = np.random.default_rng(1).integers(0, 4, self.frame.shape, dtype=np.uint8)
+        self.assertFalse(self.changed_after(lambda frame: cv2.add(frame, noise, dst=frame)))
+
+    def test_small_changes_seen(self):
+        # a 2x2 px dot anywhere, and a 2 px wide line
+        for x, y in ((101, 71), (102, 72), (60, 40)):
+            self.assertTrue(self.changed_after(
+                lambda frame: cv2.rectangle(frame, (x, y), (x + 1, y + 1), (255, 255, 255), -1)), (x, y))
+        self.assertTrue(self.changed_after(lambda frame: cv2.line(frame, (60, 80), (200, 80), (140, 140, 140), 2)))
+
+    def test_text_shift_seen(self):
+        detector = RegionChangeDetector()
+        for offset in (0, 1, 2):
+            frame = self.frame.copy()
+            cv2.putText(frame, 'Lv.90', (80 + offset, 100), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+            self.assertTrue(detector.changed('text', frame, self.box), offset)
+        self.assertEqual(detector.change_rates(), {'text': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+from ok import Box, Logger, color_range_to_bound
+from src.combat.RingDetector import RingDetector
+from src.task.BaseCombatTask import con_colors
+
+logger = Logger.get_logger(__name__)
+
+
+def loop_count_rings(image, color_range, min_area):
+    # count_rings of BaseCombatTask before RingDetector, a findContours per labeled component
+    lower_bound, upper_bound = color_range_to_bound(color_range)
+    mask = cv2.inRange(image, lower_bound, upper_bound)
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+
+    def is_full_ring(component_mask):
+        contours, _ = cv2.findContours(component_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if len(contours) != 1:
+            return False
+        epsilon = 0.05 * cv2.arcLength(contours[0], True)
+        approx = cv2.approxPolyDP(contours[0], epsilon, True)
+        return cv2.isContourConvex(approx) and len(approx) >= 4
+
+    ring_count = 0
+    is_full = False
+    the_area = 0
+    for label in range(1, num_labels):
+        x, y, width, height, area = stats[label, :5]
+        component_mask = (labels == label).astype(np.uint8) * 255
+        cv2.findContours(component_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if width * height >= min_area:
+            if is_full_ring(component_mask):
+                is_full = True
+            the_area = area
+            ring_count += 1
+    if ring_count > 1:
+        is_full = False
+        the_area = 0
+    return the_area, is_full
+
+
+class TestRingDetector(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # con_full box sized images at 2560x1440 with full, partial and broken rings plus small specks
+        rng = np.random.default_rng(0)
+        cls.min_area = 1500 / 3840 / 2160 * 2560 * 1440
+        cls.images = []
+        for i in range(60):
+            image = rng.integers(0, 60, (91, 96, 3), dtype=np.uint8)
+            color = con_colors[i % len(con_colors)]
+            bgr = tuple(int(sum(color[key]) / 2) for key in ('b', 'g', 'r'))
+            if i % 3:
+                cv2.circle(image, (48, 45), int(rng.integers(20, 40)), bgr, int(rng.integers(2, 6)))
+            if i % 4 == 0:
+                cv2.ellipse(image, (48, 45), (33, 33), 0, 0, int(rng.integers(90, 350)), bgr, 4)
+            for x, y in rng.integers(0, 90, (30, 2)):
+                image[y:y + 2, x:x + 2] = bgr
+            cls.images.append(image)
+        cls.box = Box(0, 0, 96, 91)
+
+    def test_same_as_loop(self):
+        detector = RingDetector(con_colors)
+        for image in self.images:
+            for i, color in enumerate(con_colors):
+                expected_area, expected_full = loop_count_rings(image, color, self.min_area)
+                area, is_full = detector.rings(image, self.box, self.min_area, i)
+                self.assertEqual((int(expected_area), bool(expected_full)), (int(area), bool(is_full)))
+
+    @unittest.skipUnless(os.environ.get('BENCHMARK'), 'timing only, set BENCHMARK=1 to run it')
+    def test_benchmark(self):
+        def per_frame(run):
+            # best of a few runs, a single pass over 60 small images is too noisy to compare
+            times = []
+            for _ in range(20):
+                start = time.perf_counter()
+                for image in self.images:
+                    run(image)
+                times.append((time.perf_counter() - start) / len(self.images))
+            return min(times)
+
+        loop_time = per_frame(lambda image: [loop_count_rings(image, color, self.min_area) for color in con_colors])
+        detector = RingDetector(con_colors)
+
+        def detect(image):
+            # a new frame every run, the detector caches its results for the same frame
+            frame = image.copy()
+            return [detector.rings(frame, self.box, self.min_area, i) for i in range(len(con_colors))]
+
+        detector_time = per_frame(detect)
+        logger.info(f'con rings per frame loop: {loop_time * 1000:.3f} ms, RingDetector: {detector_time * 1000:.3f} ms, '
+                    f'speedup: {loop_time / detector_time:.1f}x')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import random
+import unittest
+
+from ok import Box
+from src.map.RoutePlanner import nearest_neighbour_route, improve_route, route_length
+
+
+def loop_route(points, start_point, max_distance=0):
+    # sort_stars before the RoutePlanner, greedy nearest neighbour from the player
+    unvisited = points[:]
+    route = []
+    current_point = start_point
+    while unvisited:
+        reachable_points = [p for p in unvisited if
+                            max_distance == 0 or current_point.center_distance(p) <= max_distance]
+        if not reachable_points:
+            break
+        next_point = min(reachable_points, key=lambda p: current_point.center_distance(p))
+        route.append(next_point)
+        unvisited.remove(next_point)
+        current_point = next_point
+    return route
+
+
+class TestRoutePlanner(unittest.TestCase):
+
+    def stars(self, count, seed):
+        rng = random.Random(seed)
+        return [Box(rng.randint(0, 1900), rng.randint(0, 1060), 20, 20, name=f'star_{i}') for i in range(count)]
+
+    def test_nearest_neighbour_route(self):
+        start = Box(950, 530, 20, 20)
+        for count, max_distance in [(30, 0), (60, 300), (200, 250)]:
+            stars = self.stars(count, count)
+            self.assertEqual([star.name for star in nearest_neighbour_route(stars, start, max_distance)],
+                             [star.name for star in loop_route(stars, start, max_distance)])
+
+    def test_improve_route(self):
+        start = Box(950, 530, 20, 20)
+        for count, max_distance in [(30, 0), (200, 250)]:
+            route = nearest_neighbour_route(self.stars(count, count), start, max_distance)
+            improved = improve_route(start, route, max_distance, time_budget=1)
+            self.assertEqual(sorted(star.name for star in improved), sorted(star.name for star in route))
+            self.assertLessEqual(route_length(start, improved), route_length(start, route))
+            if not max_distance:
+                self.assertLess(route_length(start, improved), route_length(start, route) * 0.95)
+            else:
+                steps = zip([start] + improved, improved)
+                self.assertTrue(all(a.center_distance(b) <= max_distance for a, b in steps))
+
+
+if __name__ == '__main__':
+    unittest.main()
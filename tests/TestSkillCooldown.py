@@ -0,0 +1,78 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from ok import Box, get_connected_area_by_color
+from src.char.BaseChar import dot_color
+from src.combat.HudState import skill_cooldowns
+
+# the skill boxes at 4K
+boxes = {'resonance': Box(3138, 1895, 118, 78), 'echo': Box(3345, 1896, 130, 78),
+         'liberation': Box(3566, 1896, 117, 72)}
+
+
+def loop_has_cd(frame, box, screen_height):
+    # has_cd of BaseCombatTask before skill_cooldowns labeled all boxes at once
+    cropped = box.crop_frame(frame)
+    num_labels, stats, labels = get_connected_area_by_color(cropped, dot_color, connectivity=8, gray_range=22)
+    has_dot = False
+    number_count = 0
+    for i in range(1, num_labels):
+        left, top, width, height, area = stats[i]
+        if left > 0 and top > 0 and left + width < box.width and top + height < box.height:
+            if 16 / 3840 / 2160 <= area / frame.shape[0] / frame.shape[1] <= 90 / 3840 / 2160 and abs(
+                    width - height) / (width + height) < 0.3 and top / cropped.shape[0] > 0.6:
+                has_dot = True
+            elif 25 / 2160 <= height / screen_height <= 45 / 2160 and 5 / 2160 <= width / screen_height <= 35 / 2160:
+                number_count += 1
+        else:
+            return False
+    return has_dot and 2 <= number_count <= 3
+
+
+class TestSkillCooldown(unittest.TestCase):
+
+    def draw_layout(self, frame, box, rng):
+        # digits, a dot below them, and now and then a separator or a blob touching the border
+        x, y = box.x, box.y
+        gray = lambda: (int(rng.integers(200, 256)),) * 3
+        left = int(rng.integers(1, 20))
+        for _ in range(int(rng.choice([0, 1, 2, 2, 3, 3, 4]))):
+            width, height = int(rng.integers(4, 30)), int(rng.integers(20, 48))
+            top = int(rng.integers(1, max(2, box.height - height)))
+            if left + width >= box.width:
+                break
+            cv2.rectangle(frame, (x + left, y + top), (x + left + width - 1, y + top + height - 1), gray(), -1)
+            left += width + int(rng.integers(1, 6))
+        if rng.random() < 0.7:
+            size = int(rng.integers(3, 12))
+            left, top = int(rng.integers(1, box.width - size)), int(rng.integers(box.height // 2, box.height - size))
+            cv2.rectangle(frame, (x + left, y + top), (x + left + size - 1, y + top + size - 1), gray(), -1)
+        if rng.random() < 0.3:
+            left = int(rng.integers(0, box.width - 6))
+            cv2.rectangle(frame, (x + left, y + box.height - 3), (x + left + 5, y + box.height + 2), gray(), -1)
+        if rng.random() < 0.3:
+            left, top = int(rng.integers(1, box.width - 3)), int(rng.integers(1, box.height - 3))
+            cv2.line(frame, (x + left, y + top), (x + left + 2, y + top + 2), gray(), 1)
+
+    def test_same_as_has_cd(self):
+        rng = np.random.default_rng(0)
+        frame = np.zeros((2160, 3840, 3), dtype=np.uint8)
+        counts = {True: 0, False: 0}
+        for _ in range(300):
+            frame[1880:2000, 3100:3700] = rng.integers(0, 120, (120, 600, 3), dtype=np.uint8)
+            for box in boxes.values():
+                self.draw_layout(frame, box, rng)
+            cooldowns = skill_cooldowns(frame, boxes, frame.shape[0])
+            for name, box in boxes.items():
+                expected = loop_has_cd(frame, box, frame.shape[0])
+                self.assertEqual(cooldowns[name].has_cd, expected, (name, cooldowns[name]))
+                counts[expected] += 1
+        # the layouts cover both answers
+        self.assertGreater(counts[True], 50)
+        self.assertGreater(counts[False], 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
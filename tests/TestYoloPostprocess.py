@@ -0,0 +1,85 @@
+import os
+import time
+import unittest
+
+import cv2
+import numpy as np
+
+from ok import Box, Logger
+from src.OpenVinoYolo8Detect import OpenVinoYolo8Detect, numpy_nms, match_boxes, precision_recall
+
+logger = Logger.get_logger(__name__)
+
+
+def loop_postprocess(detector, outputs, padding, orig_shape, confidence_threshold, label):
+    # _postprocess before it was vectorized, one python iteration per anchor
+    outputs = np.transpose(np.squeeze(outputs[0])).copy()
+    gain = min(detector.input_height / orig_shape[0], detector.input_width / orig_shape[1])
+    outputs[:, 0] -= padding[1]
+    outputs[:, 1] -= padding[0]
+    boxes = []
+    scores = []
+    for i in range(outputs.shape[0]):
+        classes_scores = outputs[i][4:]
+        max_score = np.amax(classes_scores)
+        class_id = np.argmax(classes_scores)
+        if max_score >= confidence_threshold and (label == -1 or label == class_id):
+            x, y, w, h = outputs[i][0], outputs[i][1], outputs[i][2], outputs[i][3]
+            scores.append(max_score)
+            boxes.append([int((x - w / 2) / gain), int((y - h / 2) / gain), int(w / gain), int(h / gain)])
+    indices = cv2.dnn.NMSBoxes(boxes, scores, confidence_threshold, detector.iou_threshold)
+    return [(tuple(boxes[i]), float(scores[i])) for i in indices]
+
+
+class TestYoloPostprocess(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.detector = OpenVinoYolo8Detect(weights='assets/echo_model/best.xml')
+        cls.image = cv2.imread('tests/images/echo.png')
+        img_data, cls.pad = cls.detector._preprocess(cls.image)
+        cls.outputs = cls.detector.compiled_model({cls.detector.input_layer: img_data})[cls.detector.output_layer]
+
+    def run_postprocess(self, threshold, label=0):
+        boxes = self.detector._postprocess(self.outputs, self.pad, self.image.shape[:2], threshold, label)
+        return [((box.x, box.y, box.width, box.height), box.confidence) for box in boxes]
+
+    def test_same_as_loop(self):
+        for threshold in (0.01, 0.3, 0.5):
+            expected = loop_postprocess(self.detector, self.outputs, self.pad, self.image.shape[:2], threshold, 0)
+            self.assertEqual(expected, self.run_postprocess(threshold))
+
+    def test_numpy_nms(self):
+        rng = np.random.default_rng(0)
+        boxes = np.column_stack([rng.integers(0, 500, (400, 2)), rng.integers(1, 100, (400, 2))]).astype(np.int32)
+        scores = rng.uniform(0, 1, 400).astype(np.float32)
+        expected = np.asarray(cv2.dnn.NMSBoxes(boxes.tolist(), scores.tolist(), 0.3, 0.45)).reshape(-1)
+        self.assertEqual(expected.tolist(), numpy_nms(boxes, scores, 0.3, 0.45).tolist())
+
+    def test_match_boxes(self):
+        reference = [Box(0, 0, 10, 10, confidence=0.9), Box(100, 100, 20, 20, confidence=0.8)]
+        candidate = [Box(1, 1, 10, 10, confidence=0.7), Box(100, 100, 20, 20, confidence=0.6),
+                     Box(300, 300, 5, 5, confidence=0.5)]
+        matched = match_boxes(reference, candidate)
+        self.assertEqual(2, matched)
+        self.assertEqual({'precision': 0.6667, 'recall': 1.0}, precision_recall(2, 3, matched))
+        self.assertEqual({'precision': 1.0, 'recall': 1.0}, precision_recall(0, 0, 0))
+
+    @unittest.skipUnless(os.environ.get('BENCHMARK'), 'timing only, set BENCHMARK=1 to run it')
+    def test_benchmark(self):
+        runs = 20
+        shape = self.image.shape[:2]
+        start = time.perf_counter()
+        for _ in range(runs):
+            loop_postprocess(self.detector, self.outputs, self.pad, shape, 0.3, 0)
+        loop_time = (time.perf_counter() - start) / runs
+        start = time.perf_counter()
+        for _ in range(runs):
+            self.detector._postprocess(self.outputs, self.pad, shape, 0.3, 0)
+        vectorized_time = (time.perf_counter() - start) / runs
+        logger.info(f'postprocess echo.png loop: {loop_time * 1000:.2f} ms, '
+                    f'vectorized: {vectorized_time * 1000:.2f} ms, speedup: {loop_time / vectorized_time:.1f}x')
+
+
+if __name__ == '__main__':
+    unittest.main()